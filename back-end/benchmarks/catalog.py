@@ -0,0 +1,48 @@
+"""Матрицы признаков для бенчмарков индекса: синтетика, выгрузка в .npy или БД"""
+
+import argparse
+import asyncio
+from pathlib import Path
+
+import numpy as np
+
+from src.app.models import FEATURE_COLUMNS, crud_features
+
+
+def synthetic_features(size: int, seed: int, rank: int = 12) -> np.ndarray:
+    """Низкоранговые кластеры с шумом: признаки коррелируют, как средние и дисперсии MFCC"""
+    rng = np.random.default_rng(seed)
+    mixing = rng.standard_normal((rank, len(FEATURE_COLUMNS)))
+    centers = rng.standard_normal((32, rank))
+    latent = centers[rng.integers(0, len(centers), size)] + 0.3 * rng.standard_normal((size, rank))
+    offset = rng.uniform(0, 3, len(FEATURE_COLUMNS))
+    noise = 0.05 * rng.standard_normal((size, len(FEATURE_COLUMNS)))
+    return (latent @ mixing + offset + noise).astype(np.float32)
+
+
+async def database_features() -> np.ndarray:
+    from src.database import async_session_maker
+
+    async with async_session_maker() as session:
+        return (await crud_features.fetch_vectors(session)).vectors
+
+
+def add_catalog_arguments(parser: argparse.ArgumentParser, default_size: int = 100_000) -> None:
+    parser.add_argument("--catalog", type=int, default=default_size, help="треков в синтетическом каталоге")
+    parser.add_argument("--features", type=Path, help="матрица признаков .npy (выгрузка --export)")
+    parser.add_argument("--from-db", action="store_true", help="признаки из БД вместо синтетики")
+    parser.add_argument("--export", type=Path, help="сохранить используемую матрицу в .npy")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def load_features(args: argparse.Namespace) -> np.ndarray:
+    if args.features:
+        features = np.load(args.features).astype(np.float32, copy=False)
+    elif args.from_db:
+        features = asyncio.run(database_features())
+    else:
+        features = synthetic_features(args.catalog, args.seed)
+
+    if args.export:
+        np.save(args.export, features)
+    return features
@@ -0,0 +1,104 @@
+"""Бенчмарк декодирования: старый путь pydub -> WAV -> soundfile против ffmpeg-пайпа в float32
+
+    python -m benchmarks.decode --files track.m4a track.webm
+    python -m benchmarks.decode --synthetic-minutes 4 60 --codec aac libopus
+
+Для каждого файла печатает время и пиковую память python-процесса (tracemalloc, numpy
+учитывается) для обоих путей. Файл отдаётся кусками по 64 КБ, как при скачивании.
+"""
+
+import argparse
+import io
+import json
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+from pydub import AudioSegment
+
+from src.app.decoding import FFMPEG, SAMPLE_RATE, decode_chunks
+from benchmarks.synthetic import synthetic_track
+
+
+CODEC_EXTENSIONS = {"aac": "m4a", "libopus": "webm", "libmp3lame": "mp3"}
+FORMAT_MAP = {"m4a": "mp4", "webm": "webm", "mp4": "mp4", "mp3": "mp3"}
+
+
+def file_chunks(path: Path, size: int = 1 << 16):
+    with open(path, "rb") as f:
+        while chunk := f.read(size):
+            yield chunk
+
+
+def legacy_decode(path: Path) -> np.ndarray:
+    """Путь download_audio до перехода на ffmpeg-пайп"""
+    with io.BytesIO() as memory_file:
+        for chunk in file_chunks(path):
+            memory_file.write(chunk)
+        memory_file.seek(0)
+
+        ext = path.suffix.lstrip(".").lower()
+        audio = AudioSegment.from_file(memory_file, format=FORMAT_MAP.get(ext, ext))
+        audio = audio.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+
+        with io.BytesIO() as raw_buffer:
+            audio.export(raw_buffer, format="wav")
+            raw_buffer.seek(0)
+            data, _ = sf.read(raw_buffer)
+    return data
+
+
+def pipe_decode(path: Path) -> np.ndarray:
+    return decode_chunks(file_chunks(path))
+
+
+def measure(decode, path: Path) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    audio = decode(path)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 3), "peak_mib": round(peak / 2**20, 1), "samples": len(audio)}
+
+
+def synthetic_files(minutes: list[float], codecs: list[str], directory: Path) -> list[Path]:
+    files = []
+    for duration in minutes:
+        source = directory / f"synthetic-{duration:g}min.wav"
+        sf.write(source, synthetic_track(int(duration), duration * 60), SAMPLE_RATE)
+        for codec in codecs:
+            target = source.with_suffix(f".{CODEC_EXTENSIONS.get(codec, codec)}")
+            subprocess.run([FFMPEG, "-v", "error", "-y", "-i", source, "-c:a", codec, target], check=True)
+            files.append(target)
+        source.unlink()
+    return files
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", nargs="*", default=[])
+    parser.add_argument("--synthetic-minutes", nargs="*", type=float, default=[4.0])
+    parser.add_argument("--codec", nargs="*", default=["aac", "libopus"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = [Path(f) for f in args.files] or synthetic_files(args.synthetic_minutes, args.codec, Path(directory))
+        for path in files:
+            legacy, pipe = measure(legacy_decode, path), measure(pipe_decode, path)
+            report = {
+                "file": path.name,
+                "legacy": legacy,
+                "pipe": pipe,
+                "speedup": round(legacy["seconds"] / pipe["seconds"], 2),
+                "memory_saving": round(1 - pipe["peak_mib"] / legacy["peak_mib"], 3),
+            }
+            print(json.dumps(report, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Бенчмарк быстрого профиля анализа (окна-выдержки) против анализа всего трека
+
+    python -m benchmarks.excerpt_profile --synthetic 40 --duration 240
+    python -m benchmarks.excerpt_profile --audio-dir ~/music --excerpts 3 --seconds 30
+
+Печатает JSON: ускорение по каждому треку, дрейф векторов (косинусное расстояние и
+относительная ошибка по признакам) и как дрейф меняет соседей в HNSW-индексе:
+``query_overlap`` - запрос быстрым вектором в индекс из полных векторов,
+``index_overlap`` - индекс целиком из быстрых векторов против индекса из полных.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import librosa as lr
+import numpy as np
+from hnswlib import Index
+from sklearn.preprocessing import normalize
+
+from src.app.models import FEATURE_COLUMNS
+from src.app.services import SAMPLE_RATE, AudioData, RecomendationService
+from benchmarks.synthetic import synthetic_track
+
+
+AUDIO_EXTENSIONS = {".mp3", ".m4a", ".webm", ".wav", ".flac", ".ogg", ".opus"}
+
+
+def load_tracks(args: argparse.Namespace):
+    if args.audio_dir:
+        for path in sorted(Path(args.audio_dir).expanduser().rglob("*")):
+            if path.suffix.lower() in AUDIO_EXTENSIONS:
+                y, sr = lr.load(path, sr=SAMPLE_RATE, mono=True, duration=args.max_duration)
+                yield path.name, AudioData(y, sr)
+    else:
+        for seed in range(args.synthetic):
+            yield f"synthetic-{seed}", AudioData(synthetic_track(seed, args.duration), SAMPLE_RATE)
+
+
+def as_vector(features: dict) -> np.ndarray:
+    return np.array([np.asarray(features[column], dtype=float).ravel()[0] for column in FEATURE_COLUMNS])
+
+
+def knn(index_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    """Соседи как в build_recommendation_index, без самого трека"""
+    index = Index(space="cosine", dim=index_vectors.shape[1])
+    index.init_index(max_elements=len(index_vectors), ef_construction=200, M=16)
+    index.add_items(normalize(index_vectors), np.arange(len(index_vectors)))
+    index.set_ef(max(50, k + 1))
+    labels, _ = index.knn_query(normalize(query_vectors), k=k + 1)
+    return np.array([[label for label in row if label != i][:k] for i, row in enumerate(labels)])
+
+
+def overlap(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean([len(set(x) & set(y)) / len(x) for x, y in zip(a, b)]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio-dir", help="каталог с аудиофайлами вместо синтетики")
+    parser.add_argument("--synthetic", type=int, default=30, help="число синтетических треков")
+    parser.add_argument("--duration", type=float, default=240.0, help="длина синтетического трека, с")
+    parser.add_argument("--max-duration", type=float, default=None, help="ограничение длины файлов, с")
+    parser.add_argument("--excerpts", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--output", help="файл для JSON-отчёта (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    service = RecomendationService()
+    # Прогрев numba, чтобы JIT не попал в замеры первого трека
+    service.get_sample_features(AudioData(synthetic_track(0, 5.0), SAMPLE_RATE))
+
+    tracks, full_vectors, fast_vectors = [], [], []
+    for name, audio in load_tracks(args):
+        started = time.perf_counter()
+        full = as_vector(service.get_sample_features(audio))
+        full_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        fast = as_vector(service.get_sample_features_fast(audio, args.excerpts, args.seconds))
+        fast_time = time.perf_counter() - started
+
+        full_vectors.append(full)
+        fast_vectors.append(fast)
+        tracks.append(
+            {
+                "track": name,
+                "duration": round(len(audio.audio_data) / audio.sr, 2),
+                "full_seconds": round(full_time, 3),
+                "fast_seconds": round(fast_time, 3),
+                "speedup": round(full_time / fast_time, 2),
+                "cosine_distance": float(1.0 - normalize([full])[0] @ normalize([fast])[0]),
+            }
+        )
+        print(json.dumps(tracks[-1], ensure_ascii=False), flush=True)
+
+    full_matrix, fast_matrix = np.array(full_vectors), np.array(fast_vectors)
+    relative_error = np.abs(fast_matrix - full_matrix) / (np.abs(full_matrix) + 1e-9)
+    feature_drift = dict(zip(FEATURE_COLUMNS, np.median(relative_error, axis=0).round(4).tolist()))
+
+    report = {
+        "excerpts": args.excerpts,
+        "seconds": args.seconds,
+        "tracks": tracks,
+        "median_speedup": float(np.median([t["speedup"] for t in tracks])),
+        "mean_cosine_distance": float(np.mean([t["cosine_distance"] for t in tracks])),
+        "p95_cosine_distance": float(np.percentile([t["cosine_distance"] for t in tracks], 95)),
+        "median_relative_error": dict(sorted(feature_drift.items(), key=lambda item: -item[1])),
+    }
+    k = min(args.k, len(tracks) - 1)
+    if k > 0:
+        reference = knn(full_matrix, full_matrix, k)
+        report[f"query_overlap@{k}"] = overlap(reference, knn(full_matrix, fast_matrix, k))
+        report[f"index_overlap@{k}"] = overlap(reference, knn(fast_matrix, fast_matrix, k))
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
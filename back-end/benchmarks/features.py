@@ -0,0 +1,169 @@
+"""Бенчмарк извлечения признаков и декодирования на синтетических треках
+
+    python -m benchmarks.features --output before.json
+    python -m benchmarks.features --fixtures mix noise --durations 30 600 --modes batch streaming
+    python -m benchmarks.features --output after.json --compare before.json --threshold 0.1
+
+Фикстура синтезируется и кодируется в родительском процессе и передаётся файлами, а каждый
+случай (фикстура x длительность x режим) выполняется в отдельном процессе: пиковая память
+(выборки RSS в PeakRss вокруг замеряемого блока) не включает синтез сигнала. Режимы:
+``batch`` - get_sample_features, ``streaming`` - блоками из f32le-файла, ``fast`` - окна-выдержки,
+``decode`` - decode_chunks для трека, сжатого в --codec (путь download_audio без сети).
+В JSON для каждого случая - время по этапам (StageTimer), общее время и пиковая память.
+С ``--compare`` печатает изменения относительно старого отчёта и завершается с кодом 1,
+если какой-то случай стал медленнее больше чем на ``--threshold``.
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import librosa as lr
+import numpy as np
+import soundfile as sf
+
+from src.config import Config
+from src.app.decoding import FFMPEG, SAMPLE_RATE, decode_chunks
+from src.app.profiling import PeakRss, StageTimer
+from src.app.services import AudioData, RecomendationService
+from benchmarks.decode import CODEC_EXTENSIONS, file_chunks
+from benchmarks.synthetic import FIXTURES
+
+MODES = ("batch", "streaming", "fast", "decode")
+
+
+# Период выборки RSS: этапы анализа длятся от десятков миллисекунд
+RSS_INTERVAL = 0.01
+
+
+def prepare_fixture(fixture: str, duration: float, seed: int, codec: str | None, directory: Path) -> dict[str, Path]:
+    """Выполняется в родительском процессе: f32le-файл трека и, для режима decode, сжатый ``codec``"""
+    y = FIXTURES[fixture](seed, duration).astype(np.float32)
+    files = {"raw": directory / "track.f32"}
+    y.tofile(files["raw"])
+    if codec is not None:
+        source = directory / "track.wav"
+        files["encoded"] = source.with_suffix(f".{CODEC_EXTENSIONS.get(codec, codec)}")
+        sf.write(source, y, SAMPLE_RATE)
+        subprocess.run([FFMPEG, "-v", "error", "-y", "-i", source, "-c:a", codec, files["encoded"]], check=True)
+        source.unlink()
+    return files
+
+
+def run_case(fixture: str, duration: float, mode: str, files: dict[str, Path]) -> dict:
+    """Выполняется в дочернем процессе: один замер одного случая"""
+    service = RecomendationService()
+    # Прогрев numba, чтобы JIT не попал в замер
+    service.get_sample_features(AudioData(FIXTURES["mix"](0, 3.0), SAMPLE_RATE))
+
+    if mode in ("batch", "fast"):
+        # Трек целиком в памяти - часть режима, поэтому читается до замера и входит в пик
+        track = AudioData(np.fromfile(files["raw"], dtype=np.float32), SAMPLE_RATE)
+
+    timer = StageTimer()
+    with PeakRss(RSS_INTERVAL) as memory:
+        if mode == "streaming":
+            service.get_sample_features_streaming(str(files["raw"]), SAMPLE_RATE, timer)
+        elif mode == "decode":
+            with timer.stage("decode"):
+                decode_chunks(file_chunks(files["encoded"]), expected_samples=int((duration + 1) * SAMPLE_RATE))
+        elif mode == "fast":
+            service.get_sample_features_fast(track, Config.FAST_EXCERPT_COUNT, Config.FAST_EXCERPT_SECONDS, timer)
+        else:
+            service.get_sample_features(track, timer)
+
+    report = timer.report()
+    return {
+        "fixture": fixture,
+        "duration": duration,
+        "mode": mode,
+        "seconds": report.pop("total"),
+        "stages": report,
+        "peak_rss_mib": round(memory.peak / 2**20, 1),
+        "rss_before_mib": round(memory.baseline / 2**20, 1),
+    }
+
+
+def case_key(case: dict) -> str:
+    return f"{case['fixture']}/{case['duration']:g}s/{case['mode']}"
+
+
+def compare(current: list[dict], baseline_path: Path, threshold: float) -> bool:
+    """Печатает изменения времени и памяти; True, если нет регрессий больше threshold"""
+    previous = {case_key(case): case for case in json.loads(baseline_path.read_text())["cases"]}
+    ok = True
+    for case in current:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+
+        time_change = case["seconds"] / old["seconds"] - 1
+        memory_change = case["peak_rss_mib"] / old["peak_rss_mib"] - 1
+        stages = {
+            name: round(seconds / old["stages"][name] - 1, 3)
+            for name, seconds in case["stages"].items()
+            if old["stages"].get(name)
+        }
+        regression = time_change > threshold
+        ok &= not regression
+        line = {
+            "case": case_key(case),
+            "time_change": round(time_change, 3),
+            "memory_change": round(memory_change, 3),
+            "stages": stages,
+            "regression": regression,
+        }
+        print(json.dumps(line, ensure_ascii=False), flush=True)
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", nargs="*", default=list(FIXTURES), choices=list(FIXTURES))
+    parser.add_argument("--durations", nargs="*", type=float, default=[30.0, 180.0, 600.0, 3600.0])
+    parser.add_argument("--modes", nargs="*", default=["batch", "streaming", "decode"], choices=MODES)
+    parser.add_argument("--codec", default="aac", help="кодек для режима decode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл для JSON-отчёта (по умолчанию stdout)")
+    parser.add_argument("--compare", type=Path, help="JSON-отчёт предыдущего прогона")
+    parser.add_argument("--threshold", type=float, default=0.1, help="допустимое замедление при --compare")
+    args = parser.parse_args()
+
+    cases = []
+    context = multiprocessing.get_context("spawn")
+    codec = args.codec if "decode" in args.modes else None
+    for fixture in args.fixtures:
+        for duration in args.durations:
+            with tempfile.TemporaryDirectory() as directory:
+                files = prepare_fixture(fixture, duration, args.seed, codec, Path(directory))
+                for mode in args.modes:
+                    # maxtasksperchild=1: свежий процесс на каждый случай, память прошлых случаев не мешает
+                    with context.Pool(1, maxtasksperchild=1) as pool:
+                        case = pool.apply(run_case, (fixture, duration, mode, files))
+                    cases.append(case)
+                    print(json.dumps(case, ensure_ascii=False), file=sys.stderr, flush=True)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpu": platform.processor()},
+        "versions": {"numpy": np.__version__, "librosa": lr.__version__},
+        "cases": cases,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+    if args.compare and not compare(cases, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
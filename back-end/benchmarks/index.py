@@ -0,0 +1,126 @@
+"""Recall и задержка HNSW при разных параметрах против точного поиска перебором
+
+    python -m benchmarks.index --catalog 200000 --M 8 16 32 --ef-construction 100 200 400 --ef 10 50 100
+    python -m benchmarks.index --from-db --export features.npy --output sweep.json
+    python -m benchmarks.index --features features.npy --k 10 50
+
+Запросы - отложенные треки каталога (в индекс не входят), эталон - точный поиск
+по косинусной близости всех признаков. Для каждой пары (M, ef_construction) печатает
+время сборки, размер индекса (в памяти он занимает столько же, сколько на диске) и прирост
+RSS при сборке (занижен, если аллокатор переиспользует память, освобождённую после эталона);
+для каждого ef запроса и k - recall@k и задержку одиночного запроса p50/p99. Текущие значения
+из Config помечены ``"current": true``.
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.config import Config
+from src.app.profiling import PeakRss
+from src.app.services import RecomendationService
+from benchmarks.catalog import add_catalog_arguments, load_features
+
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int, chunk: int = 256) -> np.ndarray:
+    """Точный top-k по нормированным векторам (скалярное произведение = косинус), пачками запросов"""
+    result = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), chunk):
+        similarity = queries[start : start + chunk] @ vectors.T
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(similarity, top, axis=1), axis=1)
+        result[start : start + chunk] = np.take_along_axis(top, order, axis=1)
+    return result
+
+
+def recall(found: np.ndarray, exact: np.ndarray) -> float:
+    k = exact.shape[1]
+    return float(np.mean([len(np.intersect1d(a[:k], b)) / k for a, b in zip(found, exact)]))
+
+
+def query_latencies(index, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    labels, timings = np.empty((len(queries), k), dtype=np.int64), np.empty(len(queries))
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        found, _ = index.knn_query(query[None, :], k=k)
+        timings[i] = time.perf_counter() - started
+        labels[i] = found[0]
+    return labels, timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_catalog_arguments(parser)
+    parser.add_argument("--M", nargs="*", type=int, default=[8, 16, 32])
+    parser.add_argument("--ef-construction", nargs="*", type=int, default=[100, 200, 400])
+    parser.add_argument("--ef", nargs="*", type=int, default=[10, 25, 50, 100, 200])
+    parser.add_argument("--k", nargs="*", type=int, default=[10, 50], help="10 - top_n, 50 - k1 этапа 1")
+    parser.add_argument("--queries", type=int, default=1000, help="отложенных треков-запросов")
+    parser.add_argument("--output", help="файл для JSON-отчёта")
+    args = parser.parse_args()
+
+    service = RecomendationService()
+    features = service.index_vectors(load_features(args))
+    rng = np.random.default_rng(args.seed + 1)
+    held_out = np.zeros(len(features), dtype=bool)
+    held_out[rng.choice(len(features), size=min(args.queries, len(features) // 10), replace=False)] = True
+    vectors, queries = features[~held_out], features[held_out]
+    labels = np.arange(len(vectors), dtype=np.int64)
+
+    started = time.perf_counter()
+    exact = exact_neighbors(vectors, queries, max(args.k))
+    print(
+        json.dumps({"catalog": len(vectors), "queries": len(queries), "exact_seconds": time.perf_counter() - started}),
+        flush=True,
+    )
+
+    results = []
+    for M in args.M:
+        for ef_construction in args.ef_construction:
+            with PeakRss() as memory:
+                started = time.perf_counter()
+                index = service.create_index(vectors, labels, M=M, ef_construction=ef_construction)
+                build_seconds = time.perf_counter() - started
+
+            with tempfile.TemporaryDirectory() as directory:
+                path = Path(directory, "index.bin")
+                index.save_index(str(path))
+                index_bytes = path.stat().st_size
+
+            build = {
+                "M": M,
+                "ef_construction": ef_construction,
+                "build_seconds": round(build_seconds, 3),
+                "index_mib": round(index_bytes / 2**20, 2),
+                "build_rss_mib": round(memory.added / 2**20, 1),
+            }
+            for ef in args.ef:
+                index.set_ef(ef)
+                for k in args.k:
+                    found, timings = query_latencies(index, queries, k)
+                    p50, p99 = np.percentile(timings, [50, 99]) * 1000
+                    case = {
+                        **build,
+                        "ef": ef,
+                        "k": k,
+                        f"recall@{k}": round(recall(found, exact[:, :k]), 4),
+                        "p50_ms": round(float(p50), 4),
+                        "p99_ms": round(float(p99), 4),
+                        "current": (M, ef_construction, ef)
+                        == (Config.INDEX_M, Config.INDEX_EF_CONSTRUCTION, Config.INDEX_EF),
+                    }
+                    results.append(case)
+                    print(json.dumps(case), flush=True)
+            del index
+
+    if args.output:
+        report = {"catalog": len(vectors), "queries": len(queries), "cases": results}
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
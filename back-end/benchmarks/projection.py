@@ -0,0 +1,105 @@
+"""Сравнение индекса по всем признакам с индексами по PCA-проекции (INDEX_PCA_DIM)
+
+    python -m benchmarks.projection --catalog 100000 --dims 32 24 16
+    python -m benchmarks.projection --from-db --dims 24 16 --output projection.json
+
+Для индекса по всем признакам и для каждой размерности проекции печатает JSON: время обучения
+проекции и сборки, размер индекса на диске, медианную задержку одиночного kNN-запроса,
+среднее пересечение top-k с индексом по всем признакам и recall@k относительно точного
+поиска по всем признакам. Каталог - синтетический (benchmarks.catalog), выгрузка
+``--features`` или реальные признаки из БД (``--from-db``).
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.app.projection import Projection
+from src.app.services import RecomendationService
+from benchmarks.catalog import add_catalog_arguments, load_features
+
+
+def query_all(index, queries: np.ndarray, k: int) -> tuple[np.ndarray, float]:
+    """Одиночные запросы, как этап 1 рекомендаций; метки и медианная задержка, мс"""
+    labels, timings = [], []
+    for query in queries:
+        started = time.perf_counter()
+        found, _ = index.knn_query(query[None, :], k=k)
+        timings.append(time.perf_counter() - started)
+        labels.append(found[0])
+    return np.array(labels), float(np.median(timings)) * 1000
+
+
+def overlap(found: np.ndarray, reference: np.ndarray) -> float:
+    return float(np.mean([len(np.intersect1d(a, b)) / reference.shape[1] for a, b in zip(found, reference)]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_catalog_arguments(parser)
+    parser.add_argument("--dims", nargs="*", type=int, default=[32, 24, 16, 8], help="размерности проекций")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=50, help="top-k, как k1 этапа 1 при top_n=10")
+    parser.add_argument("--ef", type=int, default=50)
+    parser.add_argument("--output", help="файл для JSON-отчёта")
+    args = parser.parse_args()
+
+    features = load_features(args)
+    rng = np.random.default_rng(args.seed + 1)
+    query_rows = features[rng.choice(len(features), size=min(args.queries, len(features)), replace=False)]
+    labels = np.arange(len(features), dtype=np.int64)
+
+    service = RecomendationService()
+    full_vectors = service.index_vectors(features)
+    exact = np.argsort(-(service.index_vectors(query_rows) @ full_vectors.T), axis=1)[:, : args.k]
+
+    reference = None
+    cases = []
+    # Индекс по всем признакам собирается первым: с ним сравниваются остальные
+    for dim in [0] + [dim for dim in args.dims if 0 < dim < features.shape[1]]:
+        started = time.perf_counter()
+        projection = retained = None
+        if dim:
+            projection, retained = Projection.fit(features, dim, args.seed)
+        vectors = service.index_vectors(features, projection)
+        fit_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = service.create_index(vectors, labels)
+        build_seconds = time.perf_counter() - started
+        index.set_ef(args.ef)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, "index.bin")
+            index.save_index(str(path))
+            index_bytes = path.stat().st_size
+
+        found, latency_ms = query_all(index, service.index_vectors(query_rows, projection), args.k)
+        if reference is None:
+            reference = found
+
+        case = {
+            "dim": vectors.shape[1],
+            "retained_energy": round(retained, 4) if retained is not None else 1.0,
+            "fit_seconds": round(fit_seconds, 3),
+            "build_seconds": round(build_seconds, 3),
+            "index_mib": round(index_bytes / 2**20, 2),
+            "projection_kib": round(projection.components.nbytes / 2**10, 1) if projection else 0.0,
+            "query_ms": round(latency_ms, 4),
+            "overlap_with_full": round(overlap(found, reference), 4),
+            "recall_vs_exact": round(overlap(found, exact), 4),
+        }
+        cases.append(case)
+        print(json.dumps(case), flush=True)
+
+    if args.output:
+        report = {"catalog": len(features), "k": args.k, "ef": args.ef, "cases": cases}
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
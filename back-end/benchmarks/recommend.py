@@ -0,0 +1,128 @@
+"""Микробенчмарк recommend_tracks_for_playlist: задержка от размера плейлиста
+
+    python -m benchmarks.recommend --catalog 50000 --sizes 10 50 100 500 1000
+
+Сравнивает прежнюю реализацию (kNN-запрос на каждый трек плейлиста в цикле) с пакетной
+на случайном каталоге и проверяет, что рекомендации совпадают. ``table_ms`` - этап 2 по
+предрасчитанной таблице соседей (INDEX_NEIGHBORS), ``same_as_table`` - совпадение с пакетной
+(таблица считается с ef лучшего уровня, поэтому редкие расхождения ожидаемы). Печатает JSON по размерам.
+"""
+
+import argparse
+import json
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+from hnswlib import Index
+from sklearn.preprocessing import normalize
+
+from src.app.id_table import IdTable
+from src.app.models import FEATURE_COLUMNS
+from src.app.neighbors import NeighborTable
+from src.app.services import RecomendationService
+
+
+def legacy_recommend(playlist, model, id_lookup, top_n=10, diversity_k=2, neighbors_per_track=5):
+    """recommend_tracks_for_playlist до пакетных запросов"""
+    playlist_vectors = np.array([track.as_vector() for track in playlist])
+    mean_vector = normalize([playlist_vectors.mean(axis=0)])
+
+    k1 = min(top_n * 5, model.get_current_count())
+    mood_labels, distances = model.knn_query(mean_vector, k=k1)
+
+    playlist_ids = set(track.yt_id for track in playlist)
+    recommended: list[str] = []
+    for idx, dist in zip(mood_labels[0], distances[0]):
+        track_id = id_lookup.get(idx, "")
+        if track_id not in playlist_ids and track_id not in recommended:
+            recommended.append(track_id)
+        if len(recommended) >= top_n - diversity_k:
+            break
+
+    vote_counter = Counter()
+    for track in playlist:
+        vector = normalize([track.as_vector()])
+        k2 = min(neighbors_per_track, model.get_current_count())
+        labels, _ = model.knn_query(vector, k=k2)
+        for idx in labels[0]:
+            track_id = id_lookup.get(idx)
+            if track_id and track_id not in playlist_ids:
+                vote_counter[track_id] += 1
+
+    diversity_part = []
+    for track_id, _ in vote_counter.most_common():
+        if track_id not in recommended:
+            diversity_part.append(track_id)
+        if len(diversity_part) >= diversity_k:
+            break
+    return recommended + diversity_part
+
+
+def build_catalog(size: int, seed: int) -> tuple[Index, dict[int, str], np.ndarray]:
+    rng = np.random.default_rng(seed)
+    # Несколько "жанров"-кластеров, чтобы соседи были осмысленными
+    centers = rng.standard_normal((32, len(FEATURE_COLUMNS)))
+    vectors = centers[rng.integers(0, len(centers), size)] + 0.3 * rng.standard_normal((size, len(FEATURE_COLUMNS)))
+
+    index = Index(space="cosine", dim=vectors.shape[1])
+    index.init_index(max_elements=size, ef_construction=200, M=16)
+    index.add_items(normalize(vectors), np.arange(size))
+    return index, {i: f"track-{i}" for i in range(size)}, vectors
+
+
+def timed(func, repeats: int) -> tuple[float, list]:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings)), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", type=int, default=50_000, help="треков в индексе")
+    parser.add_argument("--sizes", nargs="*", type=int, default=[10, 50, 100, 500, 1000])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    index, id_lookup, vectors = build_catalog(args.catalog, args.seed)
+    ids = IdTable.from_ids(id_lookup[label] for label in range(args.catalog))
+    index.set_ef(50)
+    service = RecomendationService()
+    neighbors = NeighborTable.build(index, normalize(vectors), np.arange(args.catalog), 5, ef=50)
+    rng = np.random.default_rng(args.seed + 1)
+
+    for size in args.sizes:
+        rows = rng.choice(args.catalog, size=size, replace=False)
+        playlist = [
+            SimpleNamespace(yt_id=id_lookup[int(row)], as_vector=lambda row=row: vectors[row].tolist()) for row in rows
+        ]
+        legacy_time, legacy = timed(lambda: legacy_recommend(playlist, index, id_lookup), args.repeats)
+        batched_time, batched = timed(
+            lambda: service.recommend_tracks_for_playlist(playlist, index, ids), args.repeats
+        )
+        playlist_ids = [track.yt_id for track in playlist]
+        table_time, table = timed(
+            lambda: service.recommend_for_embedding(
+                vectors[rows].mean(axis=0), playlist_ids, index, ids, neighbors=neighbors
+            ),
+            args.repeats,
+        )
+        report = {
+            "playlist_size": size,
+            "legacy_ms": round(legacy_time * 1000, 3),
+            "batched_ms": round(batched_time * 1000, 3),
+            "speedup": round(legacy_time / batched_time, 2),
+            "same_result": legacy == batched,
+            "table_ms": round(table_time * 1000, 3),
+            "same_as_table": table == batched,
+        }
+        print(json.dumps(report), flush=True)
+
+
+if __name__ == "__main__":
+    main()
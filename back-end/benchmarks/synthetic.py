@@ -0,0 +1,93 @@
+"""Детерминированные синтетические треки для бенчмарков анализа"""
+
+import numpy as np
+
+from src.app.services import SAMPLE_RATE
+
+
+def synthetic_track(seed: int, duration: float, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Трек из секций по 15-40 с: свой темп, аккорд, тембр и уровень шума в каждой секции"""
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    y = np.zeros(n, dtype=np.float32)
+
+    offset = 0
+    while offset < n:
+        length = min(n - offset, int(rng.uniform(15, 40) * sr))
+        t = np.arange(length, dtype=np.float32) / sr
+
+        # Аккорд из гармоник со случайным тембром
+        root = 110.0 * 2 ** (rng.integers(0, 24) / 12)
+        section = np.zeros(length, dtype=np.float32)
+        for interval in rng.choice([0, 3, 4, 7, 10, 12], size=3, replace=False):
+            freq = root * 2 ** (interval / 12)
+            for harmonic in range(1, 6):
+                if freq * harmonic < sr / 2:
+                    amp = rng.uniform(0.2, 1.0) / harmonic
+                    section += amp * np.sin(2 * np.pi * freq * harmonic * t).astype(np.float32)
+        section *= 0.1
+
+        # Перкуссия: шумовые удары с затуханием в темпе секции
+        bpm = rng.uniform(70, 170)
+        hit = (rng.standard_normal(int(0.08 * sr)) * np.exp(-np.linspace(0, 8, int(0.08 * sr)))).astype(np.float32)
+        for beat in np.arange(0, length - hit.size, 60.0 / bpm * sr).astype(int):
+            section[beat : beat + hit.size] += rng.uniform(0.2, 0.6) * hit
+
+        section += rng.uniform(0.001, 0.05) * rng.standard_normal(length).astype(np.float32)
+        y[offset : offset + length] = section
+        offset += length
+
+    return y / max(float(np.abs(y).max()), 1e-6) * 0.9
+
+
+def tone_track(seed: int, duration: float, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Чистые синусоиды со сменой ноты каждые 2-8 с (тональный, почти без перкуссии)"""
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    y = np.zeros(n, dtype=np.float32)
+
+    offset, phase = 0, 0.0
+    while offset < n:
+        length = min(n - offset, int(rng.uniform(2, 8) * sr))
+        freq = 220.0 * 2 ** (rng.integers(-12, 13) / 12)
+        t = np.arange(length, dtype=np.float64) / sr
+        y[offset : offset + length] = np.sin(phase + 2 * np.pi * freq * t)
+        phase += 2 * np.pi * freq * length / sr
+        offset += length
+
+    return 0.5 * y
+
+
+def noise_track(seed: int, duration: float, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Белый шум с медленно меняющейся громкостью"""
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    points = max(int(duration / 5), 2)
+    envelope = np.interp(np.arange(n), np.linspace(0, n, points), rng.uniform(0.2, 1.0, points))
+    return (0.3 * envelope * rng.standard_normal(n)).astype(np.float32)
+
+
+def percussive_track(seed: int, duration: float, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Только удары: бочка (затухающий низкий тон) и хэт (шум) в постоянном темпе"""
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    y = np.zeros(n, dtype=np.float32)
+
+    step = 60.0 / rng.uniform(80, 160) / 2 * sr
+    kick_t = np.arange(int(0.15 * sr)) / sr
+    kick = (np.sin(2 * np.pi * 60 * kick_t) * np.exp(-kick_t * 30)).astype(np.float32)
+    hat = (rng.standard_normal(int(0.03 * sr)) * np.exp(-np.linspace(0, 6, int(0.03 * sr)))).astype(np.float32)
+    for i, beat in enumerate(np.arange(0, n - kick.size, step).astype(int)):
+        hit = kick if i % 2 == 0 else 0.4 * hat
+        y[beat : beat + hit.size] += hit
+
+    return y / max(float(np.abs(y).max()), 1e-6) * 0.9
+
+
+# Наборы фикстур бенчмарков: характер сигнала -> генератор (seed, duration, sr)
+FIXTURES = {
+    "mix": synthetic_track,
+    "tone": tone_track,
+    "noise": noise_track,
+    "percussive": percussive_track,
+}
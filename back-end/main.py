@@ -3,6 +3,7 @@ import sys
 from typing import Annotated
 
 from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqladmin import Admin
@@ -10,14 +11,18 @@ from sqladmin import Admin
 from loguru import logger
 from icecream import ic  # noqa: F401
 
+from src.config import Config
 from src.admin import authentication_backend
 from src.database import engine, async_session_maker, get_async_session
 from src.database import drop_db, create_db  # noqa: F401
 
-from src.app.models import crud_features, crud_track, crud_user
+from src.app.index_server import use_index_server
+from src.app.index_store import index_holder
+from src.app.metrics import registry
+from src.app.models import crud_track, crud_user
 from src.app.schemas import UserCreate
 from src.app.routes import router as app_router
-from src.app.tasks import track_features
+from src.app.tasks import build_recommendation_index, enqueue_stale_tracks, track_features
 from src.broker_taskiq import broker
 
 
@@ -34,6 +39,9 @@ async def lifespan(app: FastAPI):
     )
     logger.add("system-log.log", rotation="100 MB", compression="zip")
 
+    if Config.INDEX_SERVER_SOCKET:
+        use_index_server(index_holder, Config.INDEX_SERVER_SOCKET)
+
     await broker.startup()
     yield
     await broker.shutdown()
@@ -66,25 +74,29 @@ async def ping(db_session: Annotated[AsyncSession, Depends(get_async_session)]):
     return {"message": "pong"}
 
 
-@app.get("/rebuild_all_audio")
-async def rebuild_all(db_session: Annotated[AsyncSession, Depends(get_async_session)]):
-    tracks = await crud_track.get_all(db_session, limit=None)
-    f_tracks = await crud_features.get_all(db_session, limit=None)
-    ids = [item.yt_id for item in f_tracks[0]]
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return registry.render()
 
-    for track in tracks[0]:
-        if track.yt_id not in ids:
-            print(track.yt_id)
-            await track_features.kiq(track.yt_id)
 
-    return {"message": "pong"}
+@app.get("/rebuild_all_audio")
+async def rebuild_all():
+    # Сразу ставится одна пачка REANALYSIS_BATCH_SIZE, остальные устаревшие треки добирает cron
+    queued = await enqueue_stale_tracks()
+    return {"message": "pong", "queued": queued}
 
 
 @app.get("/rebuild_one_audio")
 async def rebuild_one(db_session: Annotated[AsyncSession, Depends(get_async_session)]):
     tracks = await crud_track.get_all(db_session, limit=10)
 
-    await track_features.kiq(tracks[0][0].yt_id)
+    await track_features.kiq(tracks[0][0].yt_id, force=True)
+    return {"message": "pong"}
+
+
+@app.get("/rebuild_index")
+async def rebuild_index():
+    await build_recommendation_index.kiq(full=True, force=True)
     return {"message": "pong"}
 
 
@@ -0,0 +1,28 @@
+"""playlists revision for recommendation cache invalidation
+
+Revision ID: 5c83f1e06a27
+Revises: d41e7a9c2b58
+Create Date: 2026-10-18 14:12:37.508213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c83f1e06a27'
+down_revision: Union[str, None] = 'd41e7a9c2b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('playlists', sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('playlists', 'revision')
@@ -0,0 +1,39 @@
+"""track_features extractor_version and unique yt_id
+
+Revision ID: 9b2d6f0c4e1a
+Revises: 637eca9d7b24
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2d6f0c4e1a'
+down_revision: Union[str, None] = '637eca9d7b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Существующие признаки посчитаны первой версией извлечения
+    op.add_column('track_features', sa.Column('extractor_version', sa.Integer(), server_default='1', nullable=False))
+    # Повторные анализы создавали дубли - оставляем самую свежую строку на трек
+    op.execute(
+        """
+        DELETE FROM track_features a
+        USING track_features b
+        WHERE a.yt_id = b.yt_id AND (a.created_at, a.id) < (b.created_at, b.id)
+        """
+    )
+    op.create_unique_constraint('track_features_yt_id_key', 'track_features', ['yt_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('track_features_yt_id_key', 'track_features', type_='unique')
+    op.drop_column('track_features', 'extractor_version')
@@ -0,0 +1,46 @@
+"""playlist_embeddings: persisted sum and mean of playlist feature vectors
+
+Revision ID: a7e2c9d15f40
+Revises: 5c83f1e06a27
+Create Date: 2026-10-18 15:03:51.274690
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e2c9d15f40'
+down_revision: Union[str, None] = '5c83f1e06a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Строки существующих плейлистов считаются при первом запросе рекомендаций
+    op.create_table(
+        'playlist_embeddings',
+        sa.Column('playlist_id', sa.UUID(), nullable=False),
+        sa.Column('vector_sum', postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.Column('mean_vector', postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.Column('track_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['playlist_id'], ['playlists.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('playlist_id'),
+    )
+    op.create_index(op.f('ix_playlist_embeddings_id'), 'playlist_embeddings', ['id'], unique=True)
+    op.create_index(op.f('ix_playlist_embeddings_updated_at'), 'playlist_embeddings', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_playlist_embeddings_updated_at'), table_name='playlist_embeddings')
+    op.drop_index(op.f('ix_playlist_embeddings_id'), table_name='playlist_embeddings')
+    op.drop_table('playlist_embeddings')
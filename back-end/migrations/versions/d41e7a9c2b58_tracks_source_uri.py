@@ -0,0 +1,28 @@
+"""tracks source_uri for local audio files
+
+Revision ID: d41e7a9c2b58
+Revises: 9b2d6f0c4e1a
+Create Date: 2026-10-18 11:40:03.927115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41e7a9c2b58'
+down_revision: Union[str, None] = '9b2d6f0c4e1a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tracks', sa.Column('source_uri', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tracks', 'source_uri')
@@ -0,0 +1,45 @@
+"""analysis_attempts: queued and failed background analysis of tracks
+
+Revision ID: e5b71c3a9d08
+Revises: a7e2c9d15f40
+Create Date: 2026-10-19 11:24:07.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b71c3a9d08'
+down_revision: Union[str, None] = 'a7e2c9d15f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'analysis_attempts',
+        sa.Column('yt_id', sa.String(length=25), nullable=False),
+        sa.Column('enqueued_at', sa.DateTime(), nullable=True),
+        sa.Column('failures', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('retry_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['yt_id'], ['tracks.yt_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('yt_id'),
+    )
+    op.create_index(op.f('ix_analysis_attempts_id'), 'analysis_attempts', ['id'], unique=True)
+    op.create_index(op.f('ix_analysis_attempts_updated_at'), 'analysis_attempts', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_analysis_attempts_updated_at'), table_name='analysis_attempts')
+    op.drop_index(op.f('ix_analysis_attempts_id'), table_name='analysis_attempts')
+    op.drop_table('analysis_attempts')
@@ -0,0 +1,127 @@
+import json
+import os
+import uuid
+import zlib
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from src.config import Config
+from src.app.decoding import SAMPLE_RATE
+
+
+class AudioCache:
+    """Дисковый кэш декодированного аудио по yt_id
+
+    Каждая запись - сырой f32le-файл ``<yt_id>.f32`` (моно, SAMPLE_RATE), который можно
+    открыть через ``np.memmap`` или читать блоками, и ``<yt_id>.json`` с длиной, CRC32 и
+    параметрами декодирования. Запись атомарная (tmp + os.replace), время доступа
+    обновляется при чтении, а при превышении ``max_bytes`` удаляются самые старые записи.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, verify: bool = True):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.verify = verify
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _data_path(self, yt_id: str) -> Path:
+        return self.directory / f"{yt_id}.f32"
+
+    def _meta_path(self, yt_id: str) -> Path:
+        return self.directory / f"{yt_id}.json"
+
+    def temp_path(self, yt_id: str) -> str:
+        """Путь для декодирования прямо в кэш (та же файловая система, os.replace атомарен)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return str(self.directory / f".{yt_id}.{uuid.uuid4().hex}.tmp")
+
+    @staticmethod
+    def _checksum(path: Path) -> int:
+        crc = 0
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                crc = zlib.crc32(chunk, crc)
+        return crc
+
+    def get_path(self, yt_id: str, max_duration: int | None = None) -> str | None:
+        """Путь к проверенной записи или None; битая или чужая по параметрам запись удаляется"""
+        if not self.enabled:
+            return None
+
+        data_path, meta_path = self._data_path(yt_id), self._meta_path(yt_id)
+        try:
+            meta = json.loads(meta_path.read_text())
+            size = data_path.stat().st_size
+        except (OSError, ValueError):
+            return None
+
+        if meta.get("sr") != SAMPLE_RATE or meta.get("max_duration") != max_duration:
+            return None
+        if size != meta.get("samples", -1) * np.dtype(np.float32).itemsize or (
+            self.verify and self._checksum(data_path) != meta.get("crc32")
+        ):
+            logger.warning(f"Audio cache entry is corrupted, drop: {yt_id}")
+            self.remove(yt_id)
+            return None
+
+        os.utime(data_path)
+        return str(data_path)
+
+    def get(self, yt_id: str, max_duration: int | None = None) -> np.ndarray | None:
+        path = self.get_path(yt_id, max_duration)
+        if path is None:
+            return None
+        return np.memmap(path, dtype=np.float32, mode="r")
+
+    def put_file(self, yt_id: str, raw_path: str, max_duration: int | None = None) -> str:
+        """Переносит готовый f32le-файл (из ``temp_path``) в кэш"""
+        data_path, meta_path = self._data_path(yt_id), self._meta_path(yt_id)
+        meta = {
+            "sr": SAMPLE_RATE,
+            "max_duration": max_duration,
+            "samples": os.path.getsize(raw_path) // np.dtype(np.float32).itemsize,
+            "crc32": self._checksum(Path(raw_path)),
+        }
+        meta_tmp = f"{raw_path}.json"
+        with open(meta_tmp, "w") as f:
+            json.dump(meta, f)
+
+        os.replace(raw_path, data_path)
+        os.replace(meta_tmp, meta_path)
+        self.evict()
+        return str(data_path)
+
+    def put(self, yt_id: str, audio: np.ndarray, max_duration: int | None = None) -> str:
+        raw_path = self.temp_path(yt_id)
+        np.asarray(audio, dtype=np.float32).tofile(raw_path)
+        return self.put_file(yt_id, raw_path, max_duration)
+
+    def remove(self, yt_id: str) -> None:
+        for path in (self._data_path(yt_id), self._meta_path(yt_id)):
+            path.unlink(missing_ok=True)
+
+    def evict(self) -> None:
+        """LRU: удаляет записи с самым старым временем доступа, пока кэш больше max_bytes"""
+        entries = []
+        for path in self.directory.glob("*.f32"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path.stem))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, yt_id in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(yt_id)
+            total -= size
+            logger.info(f"Audio cache evicted: {yt_id}")
+
+
+audio_cache = AudioCache(Config.AUDIO_CACHE_DIR, Config.AUDIO_CACHE_MAX_BYTES)
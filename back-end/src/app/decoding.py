@@ -0,0 +1,158 @@
+import subprocess
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Iterable
+
+import numpy as np
+
+from src.app.profiling import StageTimer
+
+FFMPEG = "ffmpeg"
+SAMPLE_RATE = 22050
+
+
+class DecodeError(Exception):
+    """ffmpeg не смог декодировать скачанный контейнер"""
+
+
+def ffmpeg_command(
+    source: str,
+    output: str = "pipe:1",
+    max_duration: int | None = None,
+    strict: bool = False,
+) -> list[str]:
+    """Контейнер -> моно f32le с частотой SAMPLE_RATE за один проход (ресемплинг делает ffmpeg)
+
+    ``strict`` - завершаться с ошибкой при любой проблеме демуксинга (иначе ffmpeg
+    возвращает 0 и пустой вывод, например для mp4 с moov в конце, прочитанного из пайпа).
+    """
+    command = [FFMPEG, "-v", "error", "-y"]
+    if strict:
+        command.append("-xerror")
+    if source != "pipe:0":
+        command.append("-nostdin")
+    command += ["-i", source]
+    if max_duration:
+        command += ["-t", str(max_duration)]
+    return command + ["-vn", "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), output]
+
+
+def read_samples(pipe: BinaryIO, expected_samples: int = 0) -> np.ndarray:
+    """Читает f32le прямо в предвыделенный numpy-буфер, без промежуточных bytes"""
+    audio = np.empty(max(expected_samples, 1 << 20), dtype=np.float32)
+    filled = 0
+    while True:
+        if filled == audio.nbytes:
+            audio = np.resize(audio, audio.size * 2)
+        read = pipe.readinto(audio.view(np.uint8)[filled:])
+        if not read:
+            break
+        filled += read
+    return audio[: filled // audio.itemsize]
+
+
+class _Feeder(threading.Thread):
+    """Пишет скачиваемые куски в stdin ffmpeg и параллельно в файл на диске
+
+    Файл нужен, если контейнер нельзя декодировать из пайпа (например, mp4 с moov в конце).
+    Если ffmpeg закрыл stdin раньше времени из-за ошибки, докачивание продолжается только в файл.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], process: subprocess.Popen, spool: BinaryIO):
+        super().__init__(daemon=True)
+        self.chunks = chunks
+        self.process = process
+        self.spool = spool
+        self.downloaded = 0
+        self.finished: float | None = None
+        self.error: Exception | None = None
+
+    def run(self) -> None:
+        stdin = self.process.stdin
+        try:
+            for chunk in self.chunks:
+                self.downloaded += len(chunk)
+                self.spool.write(chunk)
+                if stdin is None:
+                    continue
+                try:
+                    stdin.write(chunk)
+                except BrokenPipeError:
+                    stdin = None
+                    # Успешный выход по -t: докачивать остаток не нужно
+                    if self.process.wait() == 0:
+                        return
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = time.perf_counter()
+            self.spool.flush()
+            if stdin is not None:
+                try:
+                    stdin.close()
+                except BrokenPipeError:
+                    pass
+
+
+def decode_file(
+    source: str,
+    path: str | None = None,
+    max_duration: int | None = None,
+    expected_samples: int = 0,
+    stderr: bytes = b"",
+) -> np.ndarray | None:
+    """Декодирует файл на диске: в numpy-массив или в f32le-файл ``path``"""
+    process = subprocess.Popen(
+        ffmpeg_command(f"file:{source}", path or "pipe:1", max_duration),
+        stdout=subprocess.PIPE if path is None else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    audio = read_samples(process.stdout, expected_samples) if path is None else None
+    stderr = process.stderr.read() or stderr
+    if process.wait() != 0:
+        raise DecodeError(stderr.decode(errors="replace").strip())
+    return audio
+
+
+def decode_chunks(
+    chunks: Iterable[bytes],
+    path: str | None = None,
+    max_duration: int | None = None,
+    expected_samples: int = 0,
+    timer: StageTimer | None = None,
+) -> np.ndarray | None:
+    """Декодирует контейнер по мере скачивания: в numpy-массив или в f32le-файл ``path``
+
+    В ``timer`` пишутся ``download`` (пока идут куски) и ``decode`` - сколько ffmpeg работал
+    после конца скачивания; почти нулевой decode значит, что узкое место - сеть.
+    """
+    timer = timer or StageTimer()
+    started = time.perf_counter()
+    with tempfile.NamedTemporaryFile() as spool:
+        process = subprocess.Popen(
+            ffmpeg_command("pipe:0", path or "pipe:1", max_duration, strict=True),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE if path is None else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        feeder = _Feeder(chunks, process, spool)
+        feeder.start()
+
+        audio = read_samples(process.stdout, expected_samples) if path is None else None
+        stderr = process.stderr.read()
+        process.wait()
+        feeder.join()
+
+        if feeder.error is not None:
+            raise feeder.error
+        timer.add("download", feeder.finished - started)
+        timer.count("download_bytes", feeder.downloaded)
+
+        if process.returncode != 0:
+            # Контейнер не читается последовательно - декодируем из уже скачанного файла
+            del audio
+            timer.count("decode_fallback")
+            audio = decode_file(spool.name, path, max_duration, expected_samples, stderr)
+        timer.add("decode", time.perf_counter() - feeder.finished)
+        return audio
@@ -0,0 +1,87 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from loguru import logger
+
+from src.config import Config
+from src.app.profiling import StageTimer
+from src.app.services import AudioData, RecomendationService
+
+
+def analyze_audio(audio_data, sr: int, profile: str = "full") -> tuple[dict[str, Any], dict[str, float]]:
+    """Точка входа анализа в дочернем процессе: признаки и отчёт по этапам"""
+    timer = StageTimer()
+    service = RecomendationService()
+    track = AudioData(audio_data, sr)
+    if profile == "fast":
+        features = service.get_sample_features_fast(
+            track, Config.FAST_EXCERPT_COUNT, Config.FAST_EXCERPT_SECONDS, timer
+        )
+    else:
+        features = service.get_sample_features(track, timer)
+    return features, timer.report()
+
+
+def analyze_audio_file(path: str, sr: int, profile: str = "full") -> tuple[dict[str, Any], dict[str, float]]:
+    """То же для потокового режима: в процесс передаётся только путь к f32le-файлу"""
+    timer = StageTimer()
+    service = RecomendationService()
+    if profile == "fast":
+        features = service.get_sample_features_fast(path, Config.FAST_EXCERPT_COUNT, Config.FAST_EXCERPT_SECONDS, timer)
+    else:
+        features = service.get_sample_features_streaming(path, sr, timer)
+    return features, timer.report()
+
+
+class AnalysisExecutor:
+    """Выполняет CPU-ёмкий анализ вне event loop воркера с ограничением числа задач на воркер"""
+
+    def __init__(self, mode: str = "process", workers: int | None = None, max_concurrency: int | None = None):
+        if mode not in ("process", "thread"):
+            raise ValueError(f"Unknown analysis executor mode: {mode}")
+
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        # Пока часть задач анализируется, остальные успевают скачать аудио
+        self.max_concurrency = max_concurrency or self.workers * 2
+        self._pool: Executor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            logger.info(f"Analysis pool started: {self.mode} x{self.workers}, max jobs {self.max_concurrency}")
+        return self._pool
+
+    @property
+    def slot(self) -> asyncio.Semaphore:
+        """Ограничивает число одновременных задач анализа (скачивание + расчёт) в воркере"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, func, *args)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+analysis_executor = AnalysisExecutor(
+    mode=Config.ANALYSIS_EXECUTOR,
+    workers=Config.ANALYSIS_WORKERS,
+    max_concurrency=Config.ANALYSIS_MAX_CONCURRENCY,
+)
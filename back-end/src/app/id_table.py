@@ -0,0 +1,94 @@
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+# tracks.yt_id - String(25), YouTube id и id локальных треков только ASCII
+YT_ID_DTYPE = np.dtype("S25")
+# Допустимый yt_id: id YouTube (11 символов) или локального трека (lc_ + 22 hex)
+YT_ID_PATTERN = r"^[0-9A-Za-z_-]{1,25}$"
+# Свободная метка (удалённый трек)
+EMPTY = b""
+
+
+def _key(yt_id: str) -> bytes:
+    """yt_id в байтах таблицы; b"" (не найдётся) для не-ASCII и длиннее ширины столбца, а не обрезка"""
+    try:
+        key = yt_id.encode("ascii")
+    except UnicodeEncodeError:
+        return EMPTY
+    return key if len(key) <= YT_ID_DTYPE.itemsize else EMPTY
+
+
+class IdTable:
+    """Таблица label -> yt_id для HNSW-индекса в двух .npy, пригодных для memory-map
+
+    ``ids[label]`` - yt_id фиксированной ширины (``b""`` для удалённых меток), ``order`` -
+    метки, отсортированные по yt_id: обратный поиск yt_id -> label идёт бинарным поиском
+    по ``ids`` через ``order``. Загрузка снимка не читает таблицу целиком, а перевод
+    меток результата kNN в yt_id делается одной векторной выборкой.
+    """
+
+    def __init__(self, ids: np.ndarray, order: np.ndarray | None = None):
+        self.ids = ids
+        # Пустые b"" сортируются первыми, живые метки - хвост order
+        self.order = np.argsort(ids, kind="stable") if order is None else order
+
+    @classmethod
+    def from_ids(cls, yt_ids: Iterable[str]) -> "IdTable":
+        """Метка - позиция yt_id в последовательности"""
+        return cls(np.array(list(yt_ids), dtype=YT_ID_DTYPE))
+
+    @classmethod
+    def from_mapping(cls, id_lookup: dict[int, str]) -> "IdTable":
+        """Из прежнего id_lookup.json ({label: yt_id}, метки могут быть с пропусками)"""
+        ids = np.zeros(max(id_lookup, default=-1) + 1, dtype=YT_ID_DTYPE)
+        if id_lookup:
+            ids[np.fromiter(id_lookup, dtype=np.int64, count=len(id_lookup))] = list(id_lookup.values())
+        return cls(ids)
+
+    @classmethod
+    def load(cls, ids_path: Path, order_path: Path, mmap: bool = True) -> "IdTable":
+        mode = "r" if mmap else None
+        return cls(np.load(ids_path, mmap_mode=mode), np.load(order_path, mmap_mode=mode))
+
+    def save(self, ids_path: Path, order_path: Path) -> None:
+        np.save(ids_path, np.ascontiguousarray(self.ids, dtype=YT_ID_DTYPE))
+        np.save(order_path, np.ascontiguousarray(self.order, dtype=np.int64))
+
+    @property
+    def capacity(self) -> int:
+        """Число меток, включая освобождённые: следующая свободная метка"""
+        return len(self.ids)
+
+    def _first_live(self) -> int:
+        return int(np.searchsorted(self.ids, EMPTY, side="right", sorter=self.order))
+
+    def __len__(self) -> int:
+        return self.capacity - self._first_live()
+
+    def lookup(self, labels: np.ndarray | list[int]) -> list[str]:
+        """yt_id для массива меток; "" для неизвестных и удалённых"""
+        labels = np.asarray(labels, dtype=np.int64)
+        valid = (labels >= 0) & (labels < self.capacity)
+        found = np.full(labels.shape, EMPTY, dtype=YT_ID_DTYPE)
+        found[valid] = self.ids[labels[valid]]
+        return found.astype(str).tolist()
+
+    def labels_of(self, yt_ids: Iterable[str]) -> np.ndarray:
+        """Метки для yt_id; -1 для отсутствующих в таблице и непредставимых в ней"""
+        keys = np.array([_key(yt_id) for yt_id in yt_ids], dtype=YT_ID_DTYPE)
+        labels = np.full(len(keys), -1, dtype=np.int64)
+        if not len(keys) or not self.capacity:
+            return labels
+
+        positions = np.searchsorted(self.ids, keys, sorter=self.order)
+        in_range = positions < self.capacity
+        candidates = self.order[np.minimum(positions, self.capacity - 1)]
+        hit = in_range & (self.ids[candidates] == keys) & (keys != EMPTY)
+        labels[hit] = candidates[hit]
+        return labels
+
+    def yt_ids(self) -> list[str]:
+        """Все живые yt_id (в порядке сортировки)"""
+        return self.ids[self.order[self._first_live():]].astype(str).tolist()
@@ -0,0 +1,251 @@
+"""Сервер индекса рекомендаций: один процесс на хост держит HNSW-индекс в памяти
+
+    python -m src.app.index_server [--socket PATH]
+
+hnswlib не умеет открывать индекс через memory-map: каждый процесс, вызвавший load_index,
+держит свою копию графа. С INDEX_SERVER_SOCKET API-воркеры не загружают индекс, а
+отправляют kNN-запросы этому процессу по Unix-сокету. Таблица id (ids.npy) и проекция
+по-прежнему открываются в воркерах через memory-map и делят страницы page cache, поэтому
+новый воркер не добавляет памяти на трек каталога.
+
+Версия снимка указывается в каждом запросе: воркер и сервер независимо читают CURRENT,
+и сервер держит несколько последних версий, пока воркеры переключаются на новую.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from src.config import Config
+from src.app.index_store import IndexHolder, IndexSnapshot, load_snapshot, read_version
+
+# Длины JSON-заголовка и двоичной части сообщения
+FRAME = struct.Struct("!II")
+
+
+class IndexServerError(ConnectionError):
+    """Сервер индекса недоступен или вернул ошибку"""
+
+
+def _recv_exactly(sock, size: int) -> bytes:
+    chunks, received = [], 0
+    while received < size:
+        chunk = sock.recv(min(size - received, 1 << 20))
+        if not chunk:
+            raise IndexServerError("Index server closed the connection")
+        chunks.append(chunk)
+        received += len(chunk)
+    return b"".join(chunks)
+
+
+def _frame(header: dict, payload: bytes = b"") -> bytes:
+    encoded = json.dumps(header).encode()
+    return FRAME.pack(len(encoded), len(payload)) + encoded + payload
+
+
+class RemoteIndex:
+    """Клиент сервера индекса с той частью интерфейса hnswlib.Index, что нужна рекомендациям
+
+    Соединение своё у каждого потока (сервисы рекомендаций работают в asyncio.to_thread)
+    и переиспользуется между запросами и версиями.
+    """
+
+    _local = threading.local()
+
+    def __init__(self, socket_path: str, version: str, timeout: float = Config.INDEX_SERVER_TIMEOUT):
+        self.socket_path = socket_path
+        self.version = version
+        self.timeout = timeout
+        info, _ = self._call({"op": "info"})
+        self.dim = info["dim"]
+        self._count = info["count"]
+        self._max_elements = info["max_elements"]
+
+    def _connection(self):
+        connections = self._local.__dict__.setdefault("connections", {})
+        sock = connections.get(self.socket_path)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            connections[self.socket_path] = sock
+        return sock
+
+    def _call(self, header: dict, payload: bytes = b"") -> tuple[dict, bytes]:
+        try:
+            sock = self._connection()
+            sock.sendall(_frame({**header, "version": self.version}, payload))
+            header_size, payload_size = FRAME.unpack(_recv_exactly(sock, FRAME.size))
+            response = json.loads(_recv_exactly(sock, header_size))
+            data = _recv_exactly(sock, payload_size)
+        except OSError as e:
+            # Соединение в неизвестном состоянии: следующий запрос откроет новое
+            sock = self._local.__dict__.get("connections", {}).pop(self.socket_path, None)
+            if sock is not None:
+                sock.close()
+            raise e if isinstance(e, IndexServerError) else IndexServerError(f"Index server: {e}") from e
+
+        if "error" in response:
+            raise IndexServerError(f"Index server: {response['error']}")
+        return response, data
+
+    def get_current_count(self) -> int:
+        return self._count
+
+    def get_max_elements(self) -> int:
+        return self._max_elements
+
+    def knn_query(self, data, k: int = 1, num_threads: int = -1) -> tuple[np.ndarray, np.ndarray]:
+        data = np.ascontiguousarray(np.atleast_2d(data), dtype=np.float32)
+        header = {"op": "knn", "k": k, "num_threads": num_threads, "rows": len(data)}
+        response, payload = self._call(header, data.tobytes())
+        rows, k = response["shape"]
+        labels = np.frombuffer(payload, dtype=np.uint64, count=rows * k).reshape(rows, k)
+        distances = np.frombuffer(payload, dtype=np.float32, offset=labels.nbytes).reshape(rows, k)
+        return labels, distances
+
+    def get_items(self, ids, return_type: str = "numpy") -> np.ndarray:
+        labels = np.ascontiguousarray(ids, dtype=np.uint64)
+        _, payload = self._call({"op": "items"}, labels.tobytes())
+        return np.frombuffer(payload, dtype=np.float32).reshape(len(labels), self.dim)
+
+
+def remote_index(socket_path: str):
+    """open_index для load_snapshot: вместо чтения index.bin - клиент сервера той же версии"""
+    return lambda path, dim, version: RemoteIndex(socket_path, version)
+
+
+def use_index_server(holder: IndexHolder, socket_path: str) -> None:
+    """Переключает процесс API на сервер индекса"""
+    holder.loader = partial(load_snapshot, open_index=remote_index(socket_path))
+    logger.info(f"🔌 Recommendation index is served by {socket_path}")
+
+
+class IndexServer:
+    def __init__(self, socket_path: str, directory: str = Config.INDEX_DIR, keep: int = 2):
+        self.socket_path = socket_path
+        self.directory = Path(directory)
+        self.keep = keep
+        # Версия -> загрузка: запросы к версии, которая ещё читается с диска, ждут её Future,
+        # а запросы к уже загруженным версиям не ждут ничего
+        self._snapshots: OrderedDict[str, Future[IndexSnapshot]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def snapshot(self, version: str) -> IndexSnapshot:
+        """Загруженная версия; загружается при первом запросе, в памяти последние ``keep``
+
+        Под блокировкой только поиск и вставка в ``_snapshots``: загрузка идёт без неё, один раз
+        на версию, и не задерживает запросы к версиям, уже находящимся в памяти.
+        """
+        with self._lock:
+            loading = self._snapshots.get(version)
+            owner = loading is None
+            if owner:
+                loading = self._snapshots[version] = Future()
+        if not owner:
+            return loading.result()
+
+        try:
+            snapshot = load_snapshot(self.directory, version)
+        except BaseException as e:
+            # Следующий запрос попробует снова (версия могла ещё не дописаться)
+            with self._lock:
+                self._snapshots.pop(version, None)
+            loading.set_exception(e)
+            raise
+        loading.set_result(snapshot)
+        logger.info(f"✅ Index server loaded {version} ({snapshot.index.get_current_count()} elements)")
+
+        with self._lock:
+            loaded = [key for key, value in self._snapshots.items() if value.done() and key != version]
+            for old in loaded[: max(len(self._snapshots) - self.keep, 0)]:
+                del self._snapshots[old]
+        return snapshot
+
+    def handle(self, header: dict, payload: bytes) -> tuple[dict, bytes]:
+        index = self.snapshot(header["version"]).index
+        if header["op"] == "info":
+            info = {"dim": index.dim, "count": index.get_current_count(), "max_elements": index.get_max_elements()}
+            return info, b""
+
+        if header["op"] == "knn":
+            data = np.frombuffer(payload, dtype=np.float32).reshape(header["rows"], index.dim)
+            labels, distances = index.knn_query(data, k=header["k"], num_threads=header["num_threads"])
+            labels = np.ascontiguousarray(labels, dtype=np.uint64)
+            distances = np.ascontiguousarray(distances, dtype=np.float32)
+            return {"shape": list(labels.shape)}, labels.tobytes() + distances.tobytes()
+
+        if header["op"] == "items":
+            items = index.get_items(np.frombuffer(payload, dtype=np.uint64), return_type="numpy")
+            return {}, np.ascontiguousarray(items, dtype=np.float32).tobytes()
+
+        raise ValueError(f"Unknown op {header['op']}")
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    header_size, payload_size = FRAME.unpack(await reader.readexactly(FRAME.size))
+                except asyncio.IncompleteReadError:
+                    return
+                header = json.loads(await reader.readexactly(header_size))
+                payload = await reader.readexactly(payload_size)
+                try:
+                    # kNN отпускает GIL: запросы разных воркеров идут параллельно
+                    response, data = await asyncio.to_thread(self.handle, header, payload)
+                except Exception as e:
+                    logger.error(f"❌ Index server request {header.get('op')} failed: {e}")
+                    response, data = {"error": str(e)}, b""
+                writer.write(_frame(response, data))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _watch(self, interval: float) -> None:
+        """Заранее загружает новую версию, чтобы первый запрос к ней не ждал загрузки"""
+        while True:
+            version = read_version(self.directory)
+            if version is not None:
+                try:
+                    await asyncio.to_thread(self.snapshot, version)
+                except (OSError, RuntimeError, ValueError) as e:
+                    logger.warning(f"⚠  Index server failed to load {version}: {e}")
+            await asyncio.sleep(interval)
+
+    async def serve(self, interval: float = Config.INDEX_CHECK_INTERVAL) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._serve_client, path=self.socket_path)
+        logger.info(f"🔌 Index server listening on {self.socket_path}")
+        watcher = asyncio.create_task(self._watch(interval))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=Config.INDEX_SERVER_SOCKET, help="путь Unix-сокета")
+    parser.add_argument("--directory", default=Config.INDEX_DIR)
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error("--socket or INDEX_SERVER_SOCKET is required")
+
+    asyncio.run(IndexServer(args.socket, args.directory).serve())
+
+
+if __name__ == "__main__":
+    main()
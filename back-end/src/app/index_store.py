@@ -0,0 +1,350 @@
+"""Снимки индекса рекомендаций на диске
+
+    python -m src.app.index_store list
+    python -m src.app.index_store rollback [VERSION]
+
+Версия - каталог versions/<version>/ с index.bin, ids.npy, ids_order.npy, projection.npy
+(если есть) и manifest.json; опубликованная версия записана в CURRENT.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from hnswlib import Index
+from loguru import logger
+
+from src.config import Config
+from src.app.id_table import IdTable
+from src.app.models import FEATURE_COLUMNS
+from src.app.neighbors import NeighborTable
+from src.app.projection import Projection
+
+# Указатель на опубликованную версию и каталоги версий versions/<version>/
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+MANIFEST_FILE = "manifest.json"
+# Индекс до версионирования: только читается, пока не опубликована первая версия, затем удаляется
+LEGACY_INDEX_FILE = "index.bin"
+LEGACY_LOOKUP_FILE = "id_lookup.json"
+# Недособранная версия старше этого считается брошенной упавшей сборкой, с
+STALE_STAGING_SECONDS = 3600
+
+
+class IndexSnapshot(NamedTuple):
+    """Неизменяемый загруженный индекс: запрос держит ссылку на свой снимок до конца"""
+
+    version: str
+    index: Index
+    ids: IdTable
+    loaded_at: float
+    # Состояние для инкрементального обновления: watermark, next_label, deleted
+    meta: dict
+    # Проекция векторов перед индексом (INDEX_PCA_DIM), None - индекс по всем признакам
+    projection: Projection | None = None
+    # Предрасчитанные соседи треков (INDEX_NEIGHBORS), None - только запросы к индексу
+    neighbors: NeighborTable | None = None
+
+
+class SnapshotPaths(NamedTuple):
+    index: Path
+    ids: Path
+    ids_order: Path
+    meta: Path
+    projection: Path
+    neighbors: Path
+
+
+def snapshot_paths(version_dir: Path) -> SnapshotPaths:
+    """Файлы версии в её каталоге; meta - manifest.json"""
+    return SnapshotPaths(
+        version_dir / "index.bin",
+        version_dir / "ids.npy",
+        version_dir / "ids_order.npy",
+        version_dir / MANIFEST_FILE,
+        version_dir / "projection.npy",
+        version_dir / "neighbors.npy",
+    )
+
+
+def read_id_lookup(path: Path) -> IdTable:
+    with open(path, "r") as f:
+        return IdTable.from_mapping({int(k): v for k, v in json.load(f).items()})
+
+
+def _write_pointer(directory: Path, version: str) -> None:
+    tmp_path = directory / f".{CURRENT_FILE}.{version}.tmp"
+    tmp_path.write_text(version)
+    os.replace(tmp_path, directory / CURRENT_FILE)
+
+
+def save_snapshot(
+    index: Index,
+    ids: IdTable,
+    meta: dict | None = None,
+    projection: Projection | None = None,
+    neighbors: NeighborTable | None = None,
+    directory: str = Config.INDEX_DIR,
+    keep: int = Config.INDEX_KEEP_VERSIONS,
+) -> str:
+    """Собирает версию в отдельном каталоге, публикует её атомарной заменой CURRENT
+
+    Файлы пишутся во временный каталог, затем в manifest.json - их размеры и параметры
+    сборки, и каталог одним rename становится versions/<version>. Читатель, увидевший
+    версию в CURRENT, всегда находит её целиком: индекс и таблица id одной сборки.
+    Последние ``keep`` версий остаются на диске для отката (rollback_snapshot) и для
+    процессов, которые как раз загружают предыдущую.
+    """
+    directory = Path(directory)
+    versions = directory / VERSIONS_DIR
+    versions.mkdir(parents=True, exist_ok=True)
+    version = str(time.time_ns())
+    staging = versions / f".{version}.tmp"
+    staging.mkdir()
+
+    paths = snapshot_paths(staging)
+    index.save_index(str(paths.index))
+    ids.save(paths.ids, paths.ids_order)
+    if projection is not None:
+        projection.save(paths.projection)
+    if neighbors is not None:
+        neighbors.save(paths.neighbors)
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "tracks": len(ids),
+        "dim": index.dim,
+        "space": index.space,
+        "M": index.M,
+        "ef_construction": index.ef_construction,
+        "max_elements": index.get_max_elements(),
+        "meta": meta or {},
+        "files": {path.name: path.stat().st_size for path in sorted(staging.iterdir())},
+    }
+    paths.meta.write_text(json.dumps(manifest, indent=2))
+    staging.rename(versions / version)
+
+    _write_pointer(directory, version)
+    prune_snapshots(directory, keep)
+    return version
+
+
+def update_meta(version: str, directory: str | Path = Config.INDEX_DIR, **values) -> None:
+    """Дописывает ``values`` в meta опубликованной версии: manifest.json заменяется атомарно
+
+    Файлы снимка не меняются, а сам manifest.json в список размеров не входит.
+    """
+    path = Path(directory) / VERSIONS_DIR / version / MANIFEST_FILE
+    manifest = json.loads(path.read_text())
+    manifest["meta"].update(values)
+    tmp_path = path.with_name(f".{MANIFEST_FILE}.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp_path, path)
+
+
+def list_versions(directory: str | Path = Config.INDEX_DIR) -> list[str]:
+    """Опубликованные (собранные целиком) версии, от старых к новым"""
+    versions = Path(directory) / VERSIONS_DIR
+    if not versions.is_dir():
+        return []
+    found = [path.name for path in versions.iterdir() if (path / MANIFEST_FILE).exists()]
+    return sorted(found, key=int)
+
+
+def prune_snapshots(directory: Path, keep: int = Config.INDEX_KEEP_VERSIONS) -> None:
+    """Оставляет ``keep`` последних версий и текущую, удаляет брошенные сборки и индекс до версионирования"""
+    current = read_version(directory)
+    versions = list_versions(directory)
+    for old in versions[: max(len(versions) - keep, 0)]:
+        if old != current:
+            shutil.rmtree(directory / VERSIONS_DIR / old, ignore_errors=True)
+
+    for staging in (directory / VERSIONS_DIR).glob(".*.tmp"):
+        if time.time() - staging.stat().st_mtime > STALE_STAGING_SECONDS:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    for name in (LEGACY_INDEX_FILE, LEGACY_LOOKUP_FILE):
+        (directory / name).unlink(missing_ok=True)
+
+
+def rollback_snapshot(version: str | None = None, directory: str | Path = Config.INDEX_DIR) -> str:
+    """Публикует сохранённую версию (по умолчанию - предыдущую перед текущей)"""
+    directory = Path(directory)
+    versions = list_versions(directory)
+    if version is None:
+        current = read_version(directory)
+        older = [v for v in versions if current is None or int(v) < int(current)]
+        if not older:
+            raise ValueError(f"No version before {current} to roll back to")
+        version = older[-1]
+    elif version not in versions:
+        raise ValueError(f"Unknown index version {version}, available: {versions}")
+
+    _write_pointer(directory, version)
+    logger.warning(f"⏪ Index rolled back to {version}")
+    return version
+
+
+def read_version(directory: Path) -> str | None:
+    """Опубликованная версия: чтение одного маленького файла, дёшево проверять часто"""
+    try:
+        return (directory / CURRENT_FILE).read_text().strip() or None
+    except FileNotFoundError:
+        pass
+
+    legacy = directory / LEGACY_INDEX_FILE
+    if legacy.exists():
+        return f"legacy-{legacy.stat().st_mtime_ns}"
+    return None
+
+
+def read_meta(directory: str | Path = Config.INDEX_DIR) -> dict:
+    """meta опубликованной версии без загрузки индекса; {} - снимка нет или он без meta"""
+    directory = Path(directory)
+    version = read_version(directory)
+    if version is None or version.startswith("legacy-"):
+        return {}
+
+    try:
+        return json.loads((directory / VERSIONS_DIR / version / MANIFEST_FILE).read_text())["meta"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def read_index(path: Path, dim: int, version: str) -> Index:
+    """Индекс читается в память процесса целиком"""
+    index = Index(space="cosine", dim=dim)
+    index.load_index(str(path))
+    # ef не сохраняется в файле индекса
+    index.set_ef(Config.INDEX_EF)
+    return index
+
+
+def load_snapshot(
+    directory: Path,
+    version: str,
+    dim: int = len(FEATURE_COLUMNS),
+    open_index: Callable[[Path, int, str], Index] = read_index,
+) -> IndexSnapshot:
+    """Таблицы id и соседей открываются через memory-map, индекс - ``open_index`` (по умолчанию в память)"""
+    if version.startswith("legacy-"):
+        index = open_index(directory / LEGACY_INDEX_FILE, dim, version)
+        return IndexSnapshot(version, index, read_id_lookup(directory / LEGACY_LOOKUP_FILE), time.time(), {})
+
+    version_dir = directory / VERSIONS_DIR / version
+    paths = snapshot_paths(version_dir)
+    manifest = json.loads(paths.meta.read_text())
+    for name, size in manifest["files"].items():
+        if (version_dir / name).stat().st_size != size:
+            raise ValueError(f"Index snapshot {version}: {name} does not match the manifest")
+
+    projection = Projection.load(paths.projection) if paths.projection.exists() else None
+    index = open_index(paths.index, projection.dim if projection is not None else dim, version)
+    ids = IdTable.load(paths.ids, paths.ids_order)
+    neighbors = NeighborTable.load(paths.neighbors) if paths.neighbors.exists() else None
+    return IndexSnapshot(version, index, ids, time.time(), manifest["meta"], projection, neighbors)
+
+
+def load_current_snapshot(directory: str = Config.INDEX_DIR) -> IndexSnapshot | None:
+    """Последний снимок с диска (для сборщика индекса, без кэширования)"""
+    version = read_version(Path(directory))
+    return load_snapshot(Path(directory), version) if version is not None else None
+
+
+class IndexHolder:
+    """HNSW-индекс процесса: загружается один раз и перечитывается только при новой версии снимка
+
+    Новая версия загружается в фоне (в потоке) и подменяет ссылку на снимок одним
+    присваиванием; запросы, уже получившие старый снимок, дорабатывают на нём.
+    """
+
+    def __init__(
+        self,
+        directory: str = Config.INDEX_DIR,
+        check_interval: float = Config.INDEX_CHECK_INTERVAL,
+        loader: Callable[[Path, str], IndexSnapshot] = load_snapshot,
+    ):
+        self.directory = Path(directory)
+        self.check_interval = check_interval
+        # Замена загрузчика - режим сервера индекса (src.app.index_server.use_index_server)
+        self.loader = loader
+        self._snapshot: IndexSnapshot | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._reload: asyncio.Task | None = None
+
+    @property
+    def snapshot(self) -> IndexSnapshot | None:
+        return self._snapshot
+
+    def refresh(self) -> IndexSnapshot | None:
+        """Проверяет CURRENT и при изменении загружает новый снимок"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = read_version(self.directory)
+            current = self._snapshot
+            if version is None or (current is not None and current.version == version):
+                return current
+
+            started = time.perf_counter()
+            try:
+                snapshot = self.loader(self.directory, version)
+            except (OSError, RuntimeError, ValueError) as e:
+                # Версия могла смениться ещё раз, пока мы читали файлы: попробуем при следующей проверке
+                logger.warning(f"⚠  Failed to load index snapshot {version}: {e}")
+                return current
+
+            self._snapshot = snapshot
+            logger.info(
+                f"✅ Index snapshot {version} loaded in {time.perf_counter() - started:.2f}s "
+                f"({len(snapshot.ids)} tracks)"
+            )
+            return snapshot
+
+    async def get(self) -> IndexSnapshot | None:
+        """Текущий снимок; проверка версии на диске - не чаще раза в check_interval
+
+        Пока снимка нет, запрос ждёт загрузки. Иначе проверка и перезагрузка идут в фоне,
+        а запрос сразу получает текущий снимок.
+        """
+        if self._snapshot is None:
+            return await asyncio.to_thread(self.refresh)
+
+        if time.monotonic() - self._checked_at >= self.check_interval and (
+            self._reload is None or self._reload.done()
+        ):
+            self._checked_at = time.monotonic()
+            self._reload = asyncio.create_task(asyncio.to_thread(self.refresh))
+        return self._snapshot
+
+
+index_holder = IndexHolder()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["list", "rollback"])
+    parser.add_argument("version", nargs="?", help="версия для rollback (по умолчанию - предыдущая)")
+    parser.add_argument("--directory", default=Config.INDEX_DIR)
+    args = parser.parse_args()
+
+    if args.command == "rollback":
+        rollback_snapshot(args.version, args.directory)
+
+    current = read_version(Path(args.directory))
+    for version in list_versions(args.directory):
+        manifest = json.loads((Path(args.directory) / VERSIONS_DIR / version / MANIFEST_FILE).read_text())
+        marker = "*" if version == current else " "
+        print(f"{marker} {version}  {manifest['created_at']}  {manifest['tracks']} tracks  dim {manifest['dim']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Массовая загрузка локальной аудиотеки в каталог треков и анализ признаков
+
+    python -m src.app.ingest ~/music
+    python -m src.app.ingest /mnt/library --enqueue      # отдать анализ воркерам taskiq
+    python -m src.app.ingest ~/music --concurrency 8 --limit 200
+
+Треки получают id ``lc_<sha1 пути>`` и путь в tracks.source_uri. По умолчанию анализ идёт
+в этом процессе через тот же track_features (пул analysis_executor), без сети - так же
+удобно замерять весь конвейер декодирование -> признаки -> БД.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from src.broker_taskiq import broker
+from src.database import async_session_maker
+from src.app.executor import analysis_executor
+from src.app.models import crud_track
+from src.app.schemas import TrackCreate
+from src.app.sources import AUDIO_EXTENSIONS, local_source
+from src.app.tasks import track_features
+
+
+def iter_audio_files(root: Path):
+    for directory, _, files in os.walk(root):
+        for name in sorted(files):
+            path = Path(directory, name)
+            if path.suffix.lower() in AUDIO_EXTENSIONS:
+                yield path.resolve()
+
+
+async def register_tracks(paths: list[Path], concurrency: int) -> list[TrackCreate]:
+    """Создаёт строки tracks для новых файлов; метаданные читает ffprobe параллельно"""
+    ids = {local_source.track_id(path): path for path in paths}
+    async with async_session_maker() as session:
+        existing = await crud_track.get_many_by_ids(session, list(ids), column="yt_id")
+    known = {track.yt_id: track for track in existing}
+
+    probe_slot = asyncio.Semaphore(concurrency)
+
+    async def probe(track_id: str, path: Path) -> TrackCreate | None:
+        async with probe_slot:
+            try:
+                meta = await asyncio.to_thread(local_source.details, track_id, str(path))
+            except Exception as e:
+                logger.warning(f"⚠  Skip unreadable file {path}: {e}")
+                return None
+        return TrackCreate(**meta._asdict(), source_uri=str(path))
+
+    new_tracks = await asyncio.gather(*(probe(i, p) for i, p in ids.items() if i not in known))
+    new_tracks = [track for track in new_tracks if track is not None]
+    if new_tracks:
+        async with async_session_maker() as session:
+            await crud_track.create_many(session, new_tracks)
+    logger.info(f"✅ Registered {len(new_tracks)} new tracks, {len(known)} already known")
+
+    tracks = [TrackCreate.model_validate(track, from_attributes=True) for track in known.values()]
+    return tracks + new_tracks
+
+
+async def analyze(tracks: list[TrackCreate], concurrency: int) -> int:
+    # analysis_executor.slot ограничивает анализ, а этот семафор - число одновременных загрузок
+    slot = asyncio.Semaphore(concurrency)
+
+    async def run(track: TrackCreate) -> bool:
+        async with slot:
+            try:
+                await track_features(track.yt_id)
+                return True
+            except Exception as e:
+                logger.error(f"❌ Error on process {track.source_uri}: {e}")
+                return False
+
+    return sum(await asyncio.gather(*(run(track) for track in tracks)))
+
+
+async def ingest(root: Path, enqueue: bool, concurrency: int, limit: int | None) -> None:
+    paths = list(iter_audio_files(root))[:limit]
+    logger.info(f"📂 Found {len(paths)} audio files in {root}")
+    if not paths:
+        return
+    tracks = await register_tracks(paths, concurrency)
+
+    started = time.perf_counter()
+    if enqueue:
+        await broker.startup()
+        for track in tracks:
+            await track_features.kiq(track.yt_id)
+        await broker.shutdown()
+        logger.info(f"✅ Queued {len(tracks)} tracks for analysis")
+        return
+
+    try:
+        done = await analyze(tracks, concurrency)
+    finally:
+        analysis_executor.shutdown()
+    elapsed = time.perf_counter() - started
+    audio_hours = sum(track.duration for track in tracks) / 3600
+    logger.info(
+        f"🎯 Analyzed {done}/{len(tracks)} tracks ({audio_hours:.1f} h of audio) in {elapsed:.1f}s: "
+        f"{done / elapsed:.2f} tracks/s, {audio_hours * 3600 / elapsed:.0f}x realtime"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", type=Path, help="каталог с аудиофайлами (обходится рекурсивно)")
+    parser.add_argument("--enqueue", action="store_true", help="поставить анализ в очередь taskiq")
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 1, help="одновременных треков")
+    parser.add_argument("--limit", type=int, default=None, help="обработать не больше N файлов")
+    args = parser.parse_args()
+
+    asyncio.run(ingest(args.root.expanduser(), args.enqueue, args.concurrency, args.limit))
+
+
+if __name__ == "__main__":
+    main()
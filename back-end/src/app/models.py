@@ -1,16 +1,90 @@
-from datetime import datetime
+from collections import namedtuple
+from datetime import datetime, timedelta
 from uuid import UUID
 
-from sqlalchemy import ForeignKey, String, Integer, DateTime, delete, or_, select, literal
-from sqlalchemy.dialects.postgresql import UUID as UUIDCOLUMN
+import numpy as np
+
+from sqlalchemy import ForeignKey, String, Integer, DateTime, Float, and_, delete, func, or_, select, literal, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as UUIDCOLUMN, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.repository import NotFoundException, SnippetException, crud_factory as crud
+from src.config import Config
+from src.repository import IntegrityConflictException, NotFoundException, PydanticSchema, SnippetException
+from src.repository import crud_factory as crud
 from src.database import TimestampMixin, UUIDMixin
 from src.database import Base
 
 
+# yt_id, матрица признаков float32 (строка на трек) и время создания/пересчёта строки
+FeatureMatrix = namedtuple("FeatureMatrix", ["yt_ids", "vectors", "stamps"])
+
+# Порядок признаков в векторе трека (индекс рекомендаций)
+FEATURE_COLUMNS = (
+    "chroma_mean",
+    "chroma_var",
+    "rms_mean",
+    "rms_var",
+    "spectral_centroids_mean",
+    "spectral_centroids_var",
+    "spectral_bandwidth_mean",
+    "spectral_bandwidth_var",
+    "spectral_rolloff_mean",
+    "spectral_rolloff_var",
+    "spectral_contrast_mean",
+    "spectral_contrast_var",
+    "zero_crossing_rate_mean",
+    "zero_crossing_rate_var",
+    "tempo",
+    "spectral_flatness_mean",
+    "spectral_flatness_var",
+    "harmonic_percussive_ratio",
+    "mel_entropy_mean",
+    "mel_entropy_var",
+    "mfcc_1_mean",
+    "mfcc_1_var",
+    "mfcc_2_mean",
+    "mfcc_2_var",
+    "mfcc_3_mean",
+    "mfcc_3_var",
+    "mfcc_4_mean",
+    "mfcc_4_var",
+    "mfcc_5_mean",
+    "mfcc_5_var",
+    "mfcc_6_mean",
+    "mfcc_6_var",
+    "mfcc_7_mean",
+    "mfcc_7_var",
+    "mfcc_8_mean",
+    "mfcc_8_var",
+    "mfcc_9_mean",
+    "mfcc_9_var",
+    "mfcc_10_mean",
+    "mfcc_10_var",
+    "mfcc_11_mean",
+    "mfcc_11_var",
+    "mfcc_12_mean",
+    "mfcc_12_var",
+    "mfcc_13_mean",
+    "mfcc_13_var",
+    "mfcc_14_mean",
+    "mfcc_14_var",
+    "mfcc_15_mean",
+    "mfcc_15_var",
+    "mfcc_16_mean",
+    "mfcc_16_var",
+    "mfcc_17_mean",
+    "mfcc_17_var",
+    "mfcc_18_mean",
+    "mfcc_18_var",
+    "mfcc_19_mean",
+    "mfcc_19_var",
+    "mfcc_20_mean",
+    "mfcc_20_var",
+)
+
+
 class Session(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "sessions"
 
@@ -72,6 +146,12 @@ class Playlist(Base, UUIDMixin, TimestampMixin):
         nullable=True,
         insert_default=0,
     )
+    # Растёт при каждом изменении состава плейлиста: часть ключа кэша рекомендаций
+    revision: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        server_default="0",
+    )
     owner_id: Mapped[UUID] = mapped_column(
         UUIDCOLUMN(as_uuid=True),
         ForeignKey("users.id"),
@@ -92,6 +172,22 @@ class PlaylistTrack(Base, UUIDMixin, TimestampMixin):
     track: Mapped["Track"] = relationship(back_populates="playlist_tracks", lazy="joined")
 
 
+class PlaylistEmbedding(Base, UUIDMixin, TimestampMixin):
+    """Сумма векторов признаков треков плейлиста, у которых есть признаки; повторный трек учитывается один раз
+
+    Обновляется за O(1) при добавлении и удалении трека и пересчитывается целиком,
+    когда признаки трека появляются или пересчитываются.
+    """
+
+    __tablename__ = "playlist_embeddings"
+
+    playlist_id: Mapped[UUID] = mapped_column(ForeignKey("playlists.id", ondelete="CASCADE"), unique=True)
+    vector_sum: Mapped[list[float]] = mapped_column(ARRAY(Float), nullable=False)
+    # vector_sum / |vector_sum|: нормированный средний вектор, запрос этапа 1 рекомендаций
+    mean_vector: Mapped[list[float]] = mapped_column(ARRAY(Float), nullable=False)
+    track_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+
+
 class Track(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "tracks"
 
@@ -99,6 +195,8 @@ class Track(Base, UUIDMixin, TimestampMixin):
     artist: Mapped[str] = mapped_column(String, nullable=False)
     duration: Mapped[int] = mapped_column(Integer, nullable=False)
     yt_id: Mapped[str] = mapped_column(String(25), nullable=False, unique=True)
+    # Путь к файлу для локальных треков (yt_id с префиксом "lc_"), для YouTube - None
+    source_uri: Mapped[str | None] = mapped_column(String, nullable=True)
 
     playlist_tracks: Mapped[list["PlaylistTrack"]] = relationship(back_populates="track")
     features: Mapped["TrackFeature"] = relationship(back_populates="track")
@@ -106,8 +204,9 @@ class Track(Base, UUIDMixin, TimestampMixin):
 
 class TrackFeature(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "track_features"
-    yt_id: Mapped[str] = mapped_column(String, ForeignKey("tracks.yt_id"))
+    yt_id: Mapped[str] = mapped_column(String, ForeignKey("tracks.yt_id"), unique=True)
     track: Mapped["Track"] = relationship(back_populates="features")
+    extractor_version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
 
     chroma_mean: Mapped[float]
     chroma_var: Mapped[float]
@@ -192,68 +291,21 @@ class TrackFeature(Base, UUIDMixin, TimestampMixin):
     mfcc_20_var: Mapped[float]
 
     def as_vector(self) -> list[float]:
-        return [
-            self.chroma_mean,
-            self.chroma_var,
-            self.rms_mean,
-            self.rms_var,
-            self.spectral_centroids_mean,
-            self.spectral_centroids_var,
-            self.spectral_bandwidth_mean,
-            self.spectral_bandwidth_var,
-            self.spectral_rolloff_mean,
-            self.spectral_rolloff_var,
-            self.spectral_contrast_mean,
-            self.spectral_contrast_var,
-            self.zero_crossing_rate_mean,
-            self.zero_crossing_rate_var,
-            self.tempo,
-            self.spectral_flatness_mean,
-            self.spectral_flatness_var,
-            self.harmonic_percussive_ratio,
-            self.mel_entropy_mean,
-            self.mel_entropy_var,
-            self.mfcc_1_mean,
-            self.mfcc_1_var,
-            self.mfcc_2_mean,
-            self.mfcc_2_var,
-            self.mfcc_3_mean,
-            self.mfcc_3_var,
-            self.mfcc_4_mean,
-            self.mfcc_4_var,
-            self.mfcc_5_mean,
-            self.mfcc_5_var,
-            self.mfcc_6_mean,
-            self.mfcc_6_var,
-            self.mfcc_7_mean,
-            self.mfcc_7_var,
-            self.mfcc_8_mean,
-            self.mfcc_8_var,
-            self.mfcc_9_mean,
-            self.mfcc_9_var,
-            self.mfcc_10_mean,
-            self.mfcc_10_var,
-            self.mfcc_11_mean,
-            self.mfcc_11_var,
-            self.mfcc_12_mean,
-            self.mfcc_12_var,
-            self.mfcc_13_mean,
-            self.mfcc_13_var,
-            self.mfcc_14_mean,
-            self.mfcc_14_var,
-            self.mfcc_15_mean,
-            self.mfcc_15_var,
-            self.mfcc_16_mean,
-            self.mfcc_16_var,
-            self.mfcc_17_mean,
-            self.mfcc_17_var,
-            self.mfcc_18_mean,
-            self.mfcc_18_var,
-            self.mfcc_19_mean,
-            self.mfcc_19_var,
-            self.mfcc_20_mean,
-            self.mfcc_20_var,
-        ]
+        return [getattr(self, column) for column in FEATURE_COLUMNS]
+
+
+class AnalysisAttempt(Base, UUIDMixin, TimestampMixin):
+    """Фоновый анализ трека: поставлен в очередь и неудачные попытки; строка удаляется после успеха"""
+
+    __tablename__ = "analysis_attempts"
+
+    yt_id: Mapped[str] = mapped_column(String(25), ForeignKey("tracks.yt_id", ondelete="CASCADE"), unique=True)
+    # Время постановки в очередь reanalyze_stale_tracks, None - не в очереди
+    enqueued_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    failures: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    # Раньше этого времени трек после неудачи в очередь не ставится
+    retry_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
 
 
 class StatTrack(Base, UUIDMixin, TimestampMixin):
@@ -270,7 +322,6 @@ class StatUserhistory(Base, UUIDMixin, TimestampMixin):
 
 
 crud_user = crud(User)
-crud_playlist = crud(Playlist)
 crud_session = crud(Session)
 crud_history = crud(StatUserhistory)
 
@@ -293,6 +344,24 @@ class crud_stat(crud(StatTrack)):
         return entity
 
 
+class crud_playlist(crud(Playlist)):
+    @classmethod
+    async def change_tracks(cls, session: AsyncSession, playlist_id: UUID, delta: int) -> Playlist:
+        """Меняет tracks_amount на ``delta`` и увеличивает revision одним UPDATE, без чтения старых значений"""
+        q = (
+            update(Playlist)
+            .where(Playlist.id == playlist_id)
+            .values(tracks_amount=Playlist.tracks_amount + delta, revision=Playlist.revision + 1)
+            .returning(Playlist)
+        )
+        result = await session.execute(q)
+        await session.commit()
+        playlist = result.scalar_one_or_none()
+        if playlist is None:
+            raise NotFoundException(f"Not found playlist: {playlist_id}")
+        return playlist
+
+
 class crud_track(crud(Track)):
     @classmethod
     async def query_tracks(
@@ -337,6 +406,172 @@ class crud_features(crud(TrackFeature)):
 
         return entity_list
 
+    @classmethod
+    async def upsert(
+        cls,
+        session: AsyncSession,
+        data: PydanticSchema,
+    ) -> TrackFeature:
+        """Создаёт или перезаписывает признаки трека по yt_id, обновляя updated_at"""
+        values = data.model_dump(exclude_unset=True)
+        q = (
+            insert(TrackFeature)
+            .values(**values)
+            .on_conflict_do_update(
+                index_elements=[TrackFeature.yt_id],
+                set_={**values, "updated_at": func.now()},
+            )
+            .returning(TrackFeature)
+        )
+        try:
+            result = await session.execute(q)
+            entity = result.scalar_one()
+            await session.commit()
+            return entity
+        except IntegrityError as e:
+            await session.rollback()
+            raise IntegrityConflictException(
+                f"{cls.model_class.__tablename__} conflicts with existing data: {e}",
+            ) from e
+        except Exception as e:
+            await session.rollback()
+            raise SnippetException(f"Failed to upsert {cls.model_class.__tablename__}: {e}") from e
+
+    @classmethod
+    async def get_stale_yt_ids(
+        cls,
+        session: AsyncSession,
+        version: int,
+        limit: int | None = None,
+    ) -> list[str]:
+        """yt_id треков без признаков или с признаками старее ``version``; сначала треки без признаков
+
+        Пропускаются треки, уже стоящие в очереди (не дольше REANALYSIS_ENQUEUED_TTL), ждущие
+        повтора после неудачи и исчерпавшие REANALYSIS_MAX_FAILURES попыток; треки с неудачами
+        идут после остальных. Так недоступные видео не занимают каждую пачку пересчёта.
+        """
+        enqueued_ttl = timedelta(seconds=Config.REANALYSIS_ENQUEUED_TTL)
+        q = (
+            select(Track.yt_id)
+            .outerjoin(TrackFeature, TrackFeature.yt_id == Track.yt_id)
+            .outerjoin(AnalysisAttempt, AnalysisAttempt.yt_id == Track.yt_id)
+            .where(or_(TrackFeature.id.is_(None), TrackFeature.extractor_version < version))
+            .where(
+                or_(
+                    AnalysisAttempt.id.is_(None),
+                    and_(
+                        or_(
+                            AnalysisAttempt.enqueued_at.is_(None),
+                            AnalysisAttempt.enqueued_at < func.now() - enqueued_ttl,
+                        ),
+                        or_(AnalysisAttempt.retry_at.is_(None), AnalysisAttempt.retry_at <= func.now()),
+                        AnalysisAttempt.failures < Config.REANALYSIS_MAX_FAILURES,
+                    ),
+                )
+            )
+            .order_by(
+                func.coalesce(AnalysisAttempt.failures, 0),
+                TrackFeature.extractor_version.nulls_first(),
+                Track.created_at,
+            )
+        )
+        if limit is not None:
+            q = q.limit(limit)
+
+        result = await session.execute(q)
+        return list(result.scalars().all())
+
+    @classmethod
+    async def fetch_vectors(
+        cls,
+        session: AsyncSession,
+        since: datetime | None = None,
+        chunk_size: int = 10_000,
+    ) -> FeatureMatrix:
+        """yt_id и признаки потоково (server-side cursor) прямо в float32-матрицу, без ORM-объектов
+
+        Строки читаются пачками по ``chunk_size``, в памяти одновременно только одна пачка
+        кортежей и итоговая матрица: она растёт вдвое при заполнении и обрезается в конце.
+        """
+        stamp = func.coalesce(TrackFeature.updated_at, TrackFeature.created_at)
+        q = select(TrackFeature.yt_id, stamp, *(getattr(TrackFeature, c) for c in FEATURE_COLUMNS))
+        if since is not None:
+            q = q.where(TrackFeature.updated_at >= since)
+
+        vectors = np.empty((chunk_size, len(FEATURE_COLUMNS)), dtype=np.float32)
+        yt_ids: list[str] = []
+        stamps: list[datetime] = []
+
+        result = await session.stream(q.execution_options(yield_per=chunk_size))
+        async for chunk in result.partitions(chunk_size):
+            start = len(yt_ids)
+            if start + len(chunk) > len(vectors):
+                # Рост вдвое на месте (realloc): строки уже заполненной части сохраняются
+                vectors.resize((max(2 * len(vectors), start + len(chunk)), len(FEATURE_COLUMNS)), refcheck=False)
+            vectors[start : start + len(chunk)] = [row[2:] for row in chunk]
+            yt_ids.extend(row[0] for row in chunk)
+            stamps.extend(row[1] for row in chunk)
+
+        # Обрезка лишних строк тоже на месте
+        vectors.resize((len(yt_ids), len(FEATURE_COLUMNS)), refcheck=False)
+        return FeatureMatrix(yt_ids, vectors, stamps)
+
+    @classmethod
+    async def fingerprint(cls, session: AsyncSession) -> str:
+        """Дешёвый отпечаток таблицы признаков: число строк и самый поздний штамп изменения
+
+        Добавление и пересчёт сдвигают штамп, удаление меняет число строк, поэтому при
+        совпадении отпечатка со снимком индекс собран по тем же строкам.
+        """
+        stamp = func.max(func.coalesce(TrackFeature.updated_at, TrackFeature.created_at))
+        total, latest = (await session.execute(select(func.count(), stamp).select_from(TrackFeature))).one()
+        return f"{total}:{latest.isoformat() if latest is not None else ''}"
+
+    @classmethod
+    async def get_all_yt_ids(cls, session: AsyncSession) -> set[str]:
+        result = await session.execute(select(TrackFeature.yt_id))
+        return set(result.scalars().all())
+
+
+class crud_analysis_attempt(crud(AnalysisAttempt)):
+    @classmethod
+    async def mark_enqueued(cls, session: AsyncSession, yt_ids: list[str], chunk_size: int = 1000) -> None:
+        """Отмечает треки поставленными в очередь; INSERT пачками, в пределах лимита параметров asyncpg"""
+        for start in range(0, len(yt_ids), chunk_size):
+            chunk = yt_ids[start : start + chunk_size]
+            stmt = insert(AnalysisAttempt).values([{"yt_id": yt_id, "enqueued_at": func.now()} for yt_id in chunk])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[AnalysisAttempt.yt_id],
+                set_={"enqueued_at": func.now(), "updated_at": func.now()},
+            )
+            await session.execute(stmt)
+        await session.commit()
+
+    @classmethod
+    async def record_failure(cls, session: AsyncSession, yt_id: str, error: str) -> int:
+        """Неудачная попытка: повтор через REANALYSIS_RETRY_SECONDS * 2^(неудач - 1); возвращает число неудач"""
+        base = timedelta(seconds=Config.REANALYSIS_RETRY_SECONDS)
+        stmt = insert(AnalysisAttempt).values(yt_id=yt_id, failures=1, retry_at=func.now() + base, last_error=error)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AnalysisAttempt.yt_id],
+            set_={
+                "failures": AnalysisAttempt.failures + 1,
+                # Степень ограничена: не дальше 2^10 базовых интервалов
+                "retry_at": func.now() + base * func.power(2, func.least(AnalysisAttempt.failures, 10)),
+                "enqueued_at": None,
+                "last_error": error,
+                "updated_at": func.now(),
+            },
+        )
+        failures = (await session.execute(stmt.returning(AnalysisAttempt.failures))).scalar_one()
+        await session.commit()
+        return failures
+
+    @classmethod
+    async def clear(cls, session: AsyncSession, yt_id: str) -> None:
+        await session.execute(delete(AnalysisAttempt).where(AnalysisAttempt.yt_id == yt_id))
+        await session.commit()
+
 
 class crud_playlist_track(crud(PlaylistTrack)):
     @classmethod
@@ -358,6 +593,18 @@ class crud_playlist_track(crud(PlaylistTrack)):
 
         return entity
 
+    @classmethod
+    async def get_yt_ids(cls, session: AsyncSession, playlist_id: UUID) -> list[str]:
+        """yt_id треков плейлиста по порядку, без повторов"""
+        q = (
+            select(Track.yt_id, func.min(PlaylistTrack.position).label("position"))
+            .join(PlaylistTrack, PlaylistTrack.track_id == Track.id)
+            .where(PlaylistTrack.playlist_id == playlist_id)
+            .group_by(Track.yt_id)
+            .order_by("position")
+        )
+        return list((await session.execute(q)).scalars().all())
+
     @classmethod
     async def remove_by_track_and_playlist(
         cls,
@@ -386,3 +633,114 @@ class crud_playlist_track(crud(PlaylistTrack)):
             if not isinstance(e, SnippetException):
                 raise SnippetException(f"Failed to remove {cls.model_class.__tablename__}: {e}") from e
             raise
+
+
+class crud_playlist_embedding(crud(PlaylistEmbedding)):
+    @staticmethod
+    def _values(vector_sum: np.ndarray, track_count: int) -> dict:
+        if track_count <= 0:
+            vector_sum, track_count = np.zeros(len(FEATURE_COLUMNS)), 0
+        norm = np.linalg.norm(vector_sum)
+        mean_vector = vector_sum / norm if norm > 0 else vector_sum
+        return {"vector_sum": vector_sum.tolist(), "mean_vector": mean_vector.tolist(), "track_count": track_count}
+
+    @classmethod
+    async def get_by_playlist(cls, session: AsyncSession, playlist_id: UUID) -> PlaylistEmbedding:
+        """Вектор плейлиста; если строки ещё нет (плейлист старше таблицы) - считается по трекам"""
+        q = select(PlaylistEmbedding).where(PlaylistEmbedding.playlist_id == playlist_id)
+        embedding = (await session.execute(q)).scalar_one_or_none()
+        if embedding is None:
+            await cls.recompute(session, [playlist_id])
+            embedding = (await session.execute(q)).scalar_one()
+        return embedding
+
+    @staticmethod
+    def _presence_change(rows: int, weight: int) -> int:
+        """+1/-1, если трек появился в плейлисте или исчез; ``rows`` - его строк после изменения на ``weight``"""
+        return int(rows > 0) - int(rows - weight > 0)
+
+    @classmethod
+    async def apply_track(cls, session: AsyncSession, playlist_id: UUID, track_id: UUID, weight: int = 1) -> bool:
+        """Учитывает ``weight`` добавленных (отрицательный - удалённых) строк трека; False, если у трека нет признаков
+
+        Вызывается после изменения playlist_tracks. Вектор прибавляется или вычитается, только
+        когда трек появился в плейлисте или исчез из него: повторное добавление вес не меняет.
+        Если строки плейлиста ещё нет, она считается по трекам целиком и уже учитывает изменение.
+        """
+        q = select(*(getattr(TrackFeature, c) for c in FEATURE_COLUMNS)).join(Track, TrackFeature.track)
+        vector = (await session.execute(q.where(Track.id == track_id))).first()
+        if vector is None:
+            return False
+
+        q = select(PlaylistEmbedding).where(PlaylistEmbedding.playlist_id == playlist_id).with_for_update()
+        embedding = (await session.execute(q)).scalar_one_or_none()
+        if embedding is None:
+            await cls.recompute(session, [playlist_id])
+            return True
+
+        q = select(func.count()).where(PlaylistTrack.playlist_id == playlist_id, PlaylistTrack.track_id == track_id)
+        change = cls._presence_change((await session.execute(q)).scalar_one(), weight)
+        if not change:
+            await session.commit()
+            return True
+
+        vector_sum = np.asarray(embedding.vector_sum, dtype=np.float64) + change * np.asarray(vector, dtype=np.float64)
+        values = cls._values(vector_sum, embedding.track_count + change)
+        await session.execute(
+            update(PlaylistEmbedding)
+            .where(PlaylistEmbedding.playlist_id == playlist_id)
+            .values(**values, updated_at=func.now())
+        )
+        await session.commit()
+        return True
+
+    @classmethod
+    async def recompute(cls, session: AsyncSession, playlist_ids: list[UUID]) -> None:
+        """Пересчёт с нуля одним агрегирующим запросом (сверка после появления признаков трека)"""
+        if not playlist_ids:
+            return
+
+        # Каждый трек плейлиста один раз, как в прежнем get_by_playlist
+        tracks = (
+            select(PlaylistTrack.playlist_id, PlaylistTrack.track_id)
+            .where(PlaylistTrack.playlist_id.in_(playlist_ids))
+            .distinct()
+            .subquery()
+        )
+        q = (
+            select(tracks.c.playlist_id, func.count(), *(func.sum(getattr(TrackFeature, c)) for c in FEATURE_COLUMNS))
+            .join(Track, Track.id == tracks.c.track_id)
+            .join(TrackFeature, TrackFeature.yt_id == Track.yt_id)
+            .group_by(tracks.c.playlist_id)
+        )
+        sums = {row[0]: (np.asarray(row[2:], dtype=np.float64), row[1]) for row in await session.execute(q)}
+
+        rows = [
+            {"playlist_id": playlist_id, **cls._values(*sums.get(playlist_id, (None, 0)))}
+            for playlist_id in playlist_ids
+        ]
+        stmt = insert(PlaylistEmbedding).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PlaylistEmbedding.playlist_id],
+            set_={
+                "vector_sum": stmt.excluded.vector_sum,
+                "mean_vector": stmt.excluded.mean_vector,
+                "track_count": stmt.excluded.track_count,
+                "updated_at": func.now(),
+            },
+        )
+        await session.execute(stmt)
+        await session.commit()
+
+    @classmethod
+    async def recompute_for_track(cls, session: AsyncSession, yt_id: str) -> int:
+        """Пересчитывает плейлисты с этим треком; возвращает их число"""
+        q = (
+            select(PlaylistTrack.playlist_id)
+            .join(Track, Track.id == PlaylistTrack.track_id)
+            .where(Track.yt_id == yt_id)
+            .distinct()
+        )
+        playlist_ids = list((await session.execute(q)).scalars().all())
+        await cls.recompute(session, playlist_ids)
+        return len(playlist_ids)
@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import numpy as np
+from hnswlib import Index
+
+from src.config import Config
+
+# Строк на один пакетный kNN-запрос при расчёте таблицы: hnswlib раскидывает их по потокам
+NEIGHBOR_BATCH = 10_000
+# Метка отсутствующего соседа (трек вне индекса или в индексе меньше k элементов)
+NO_NEIGHBOR = -1
+
+
+class NeighborTable:
+    """Предрасчитанные ``k`` ближайших соседей каждого трека индекса: строка = метка трека
+
+    Соседи меняются только вместе с индексом, поэтому считаются при сборке снимка, а не
+    в каждом запросе: этап 2 рекомендаций и похожие треки сводятся к выборке строк.
+    Как и при онлайн-запросе, первый сосед обычно сам трек.
+    """
+
+    def __init__(self, labels: np.ndarray):
+        self.labels = labels
+
+    @property
+    def k(self) -> int:
+        return self.labels.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @classmethod
+    def build(
+        cls,
+        index: Index,
+        vectors: np.ndarray,
+        labels: np.ndarray,
+        k: int,
+        ef: int = 0,
+        batch: int = NEIGHBOR_BATCH,
+    ) -> "NeighborTable":
+        """``vectors`` - в пространстве индекса, ``ef`` - ширина поиска (0 - ef индекса)"""
+        size = int(labels.max()) + 1 if len(labels) else 0
+        table = cls(np.full((size, k), NO_NEIGHBOR, dtype=np.int32))
+        table._fill(index, vectors, labels, len(labels), ef, batch)
+        return table
+
+    def update(
+        self,
+        index: Index,
+        vectors: np.ndarray,
+        labels: np.ndarray,
+        removed: np.ndarray,
+        size: int,
+        count: int,
+        ef: int = 0,
+    ) -> "NeighborTable":
+        """Новая таблица после инкрементального обновления индекса; ``count`` - живых треков в индексе
+
+        Строки новых и пересчитанных треков считаются заново, строки удалённых очищаются.
+        Остальные строки не пересчитываются: новые треки появятся в них после полной
+        пересборки, а удалённые соседи отсеиваются по таблице id.
+        """
+        table = np.full((max(size, len(self.labels)), self.k), NO_NEIGHBOR, dtype=np.int32)
+        table[: len(self.labels)] = self.labels
+        table[removed] = NO_NEIGHBOR
+        updated = NeighborTable(table)
+        updated._fill(index, vectors, labels, count, ef, NEIGHBOR_BATCH)
+        return updated
+
+    def _fill(self, index: Index, vectors: np.ndarray, labels: np.ndarray, count: int, ef: int, batch: int) -> None:
+        # ef задаётся через k, как в RecomendationService.knn_query: общий ef индекса не меняется.
+        # get_current_count учитывает и mark_deleted, поэтому предел - живые треки ``count``
+        k = min(self.k, count)
+        wide = min(max(k, ef), count)
+        for start in range(0, len(labels), batch):
+            found, _ = index.knn_query(vectors[start : start + batch], k=wide, num_threads=Config.INDEX_BUILD_THREADS)
+            self.labels[labels[start : start + batch], :k] = found[:, :k]
+
+    def lookup(self, labels: np.ndarray, k: int) -> np.ndarray:
+        """Первые ``k`` соседей треков ``labels`` без отсутствующих, одним массивом"""
+        labels = np.asarray(labels, dtype=np.int64)
+        neighbors = self.labels[labels[labels < len(self.labels)], :k].ravel()
+        return neighbors[neighbors != NO_NEIGHBOR]
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "NeighborTable":
+        return cls(np.load(path, mmap_mode="r" if mmap else None))
+
+    def save(self, path: Path) -> None:
+        np.save(path, np.ascontiguousarray(self.labels, dtype=np.int32))
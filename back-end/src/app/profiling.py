@@ -0,0 +1,87 @@
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+
+def format_report(report: dict[str, float]) -> str:
+    return " | ".join(f"{name}: {seconds:.3f}s" for name, seconds in report.items())
+
+
+class StageTimer:
+    """Собирает время (по часам) именованных этапов одного запуска анализа"""
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        # Не временные величины этапов: скачанные байты, попадания в кэш и т.п.
+        self.counters: dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        """Время этапа, измеренное снаружи (например, в другом потоке или процессе)"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self._started
+
+    def report(self) -> dict[str, float]:
+        report = {name: round(seconds, 4) for name, seconds in self.stages.items()}
+        report["total"] = round(self.total, 4)
+        return report
+
+    def format(self) -> str:
+        return format_report(self.report())
+
+
+def current_rss() -> int:
+    """Текущий RSS процесса в байтах (на linux из /proc, иначе пиковый ru_maxrss)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRss:
+    """Замеряет RSS процесса в фоновом потоке; ``peak - baseline`` - сколько добавил блок
+
+    В отличие от tracemalloc видит и память C-расширений (hnswlib, asyncpg) и не замедляет код.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.baseline = self.peak = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self) -> "PeakRss":
+        self.baseline = self.peak = current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True, name="rss-sampler")
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    @property
+    def added(self) -> int:
+        return self.peak - self.baseline
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import numpy as np
+from sklearn.preprocessing import normalize
+
+# Строк выборки для SVD: компоненты по 100k треков почти не отличаются от полных
+FIT_SAMPLE = 100_000
+
+
+class Projection:
+    """Линейная проекция нормированных векторов признаков в ``dim`` измерений (PCA без центрирования)
+
+    Компоненты - главные правые сингулярные векторы матрицы нормированных признаков: без
+    центрирования проекция лучше всего сохраняет скалярные произведения, то есть косинусную
+    близость, по которой строится индекс. Признаки сильно коррелируют (средние и дисперсии MFCC),
+    поэтому большая часть энергии укладывается в первые компоненты.
+    """
+
+    def __init__(self, components: np.ndarray):
+        self.components = np.asarray(components, dtype=np.float32)
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dim: int, seed: int = 0) -> tuple["Projection", float]:
+        """Проекция по нормированным векторам и доля сохранённой энергии"""
+        if len(vectors) > FIT_SAMPLE:
+            vectors = vectors[np.random.default_rng(seed).choice(len(vectors), FIT_SAMPLE, replace=False)]
+        _, singular, vt = np.linalg.svd(normalize(vectors), full_matrices=False)
+        energy = singular**2
+        return cls(vt[:dim]), float(energy[:dim].sum() / energy.sum())
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """Нормированные векторы -> нормированные проекции (для cosine-индекса)"""
+        return normalize(np.asarray(vectors, dtype=np.float32) @ self.components.T)
+
+    @classmethod
+    def load(cls, path: Path) -> "Projection":
+        return cls(np.load(path))
+
+    def save(self, path: Path) -> None:
+        np.save(path, self.components)
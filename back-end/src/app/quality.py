@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import NamedTuple
+
+from loguru import logger
+
+from src.config import Config
+from src.app.metrics import registry
+
+recommendation_seconds = registry.histogram(
+    "recommendation_seconds", "Recommendation computation time (with thread pool wait) by served tier", ("tier",)
+)
+recommendation_tiers = registry.counter(
+    "recommendation_tier_total", "Recommendation requests by requested and served quality tier", ("requested", "served")
+)
+
+
+class QualityTier(NamedTuple):
+    name: str
+    # Ширина поиска HNSW
+    ef: int
+    # Кандидатов этапа 1: k1 = top_n * pool
+    pool: int
+    # Соседей на трек плейлиста для голосования этапа 2
+    neighbors: int
+
+
+class TierSelector:
+    """Уровень качества рекомендаций по бюджету задержки
+
+    Для каждого уровня хранится скользящее среднее времени расчёта вместе с ожиданием
+    свободного потока, то есть с учётом нагрузки. Если оценка запрошенного уровня выше
+    бюджета, отдаётся следующий, более дешёвый; последний уровень отдаётся всегда. Оценка,
+    не обновлявшаяся ``recovery`` секунд, забывается, и уровень пробуется снова.
+    """
+
+    def __init__(
+        self,
+        tiers: list[QualityTier],
+        default: str,
+        budget: float,
+        alpha: float = 0.2,
+        recovery: float = 30.0,
+    ):
+        # От дорогого к дешёвому
+        self.tiers = {tier.name: tier for tier in tiers}
+        self.order = [tier.name for tier in tiers]
+        self.default = default
+        self.budget = budget
+        self.alpha = alpha
+        self.recovery = recovery
+        # name -> (оценка, с; время обновления)
+        self._estimates: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "TierSelector":
+        tiers = [QualityTier(name, **params) for name, params in Config.RECOMMEND_TIERS.items()]
+        return cls(tiers, Config.RECOMMEND_DEFAULT_TIER, Config.RECOMMEND_LATENCY_BUDGET_MS / 1000)
+
+    def _estimate(self, name: str, now: float) -> float | None:
+        estimate = self._estimates.get(name)
+        if estimate is None or now - estimate[1] > self.recovery:
+            return None
+        return estimate[0]
+
+    def choose(self, requested: str | None = None) -> QualityTier:
+        requested = requested or self.default
+        now = time.monotonic()
+        with self._lock:
+            for name in self.order[self.order.index(requested) :]:
+                estimate = self._estimate(name, now)
+                if estimate is None or estimate <= self.budget:
+                    break
+
+        recommendation_tiers.inc(requested=requested, served=name)
+        return self.tiers[name]
+
+    def observe(self, tier: QualityTier, seconds: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            estimate = self._estimate(tier.name, now)
+            smoothed = seconds if estimate is None else estimate + self.alpha * (seconds - estimate)
+            self._estimates[tier.name] = (smoothed, now)
+        recommendation_seconds.observe(seconds, tier=tier.name)
+
+        if (estimate is None or estimate <= self.budget) and smoothed > self.budget:
+            logger.warning(f"⏬ Recommendation tier {tier.name} is over budget: {smoothed * 1000:.0f}ms")
+
+
+tier_selector = TierSelector.from_config()
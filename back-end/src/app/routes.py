@@ -1,11 +1,11 @@
+import asyncio
+import time
 from datetime import datetime, date
-import json
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Cookie, Depends, HTTPException, Response, status
+from fastapi import APIRouter, Cookie, Depends, HTTPException, Path, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from hnswlib import Index
 from pytubefix.exceptions import VideoUnavailable
 from loguru import logger
 
@@ -15,8 +15,13 @@ from src.database import get_async_session
 
 from src.app.services import RecomendationService, YTService, get_artist_popularity_by_date, plst_owned_by_user
 from src.app.tasks import track_features
+from src.app.index_store import index_holder
+from src.app.id_table import YT_ID_PATTERN
+from src.app.index_server import IndexServerError
+from src.app.metrics import registry
+from src.app.quality import tier_selector
 from src.app.models import (
-    crud_features,
+    crud_playlist_embedding,
     crud_playlist_track,
     crud_playlist,
     crud_user,
@@ -43,15 +48,30 @@ from src.app.schemas import (
     TrackSwap,
     PlaylistRead,
     PlaylistCreate,
-    PlaylistUpdate,
     PlaylistTrackCreate,
     PlaylistTrackUpdate,
     ArtistPopylarity,
 )
-from src.utils import cache_response
+from src.utils import LRUCache, cache_response
 
 router = APIRouter(prefix="/app", tags=["app"])
 
+# (плейлист, уровень качества) -> ((revision плейлиста, версия индекса), рекомендации)
+recommendation_cache = LRUCache(Config.RECOMMEND_CACHE_SIZE)
+recommendation_cache_requests = registry.counter(
+    "recommendation_cache_total", "Playlist recommendation cache lookups", ("result",)
+)
+
+# (yt_id, версия индекса) -> похожие треки; записи прошлых версий вытесняются сами
+similar_cache = LRUCache(Config.SIMILAR_CACHE_SIZE)
+similar_cache_requests = registry.counter("similar_tracks_cache_total", "Similar tracks cache lookups", ("result",))
+
+
+def invalidate_recommendations(playlist_id: UUID) -> None:
+    """Сбрасывает кэш плейлиста в этом процессе; другие процессы увидят новую revision"""
+    for tier in tier_selector.order:
+        recommendation_cache.pop((playlist_id, tier))
+
 
 @router.post("/login")
 async def login(
@@ -184,6 +204,53 @@ async def get_tracks_by_query(
     return [TrackRead.model_validate(track) for track in tracks]
 
 
+@router.get("/tracks/{yt_id}/similar", status_code=status.HTTP_200_OK)
+async def get_similar_tracks(
+    yt_id: Annotated[str, Path(pattern=YT_ID_PATTERN)],
+    db_session: Annotated[AsyncSession, Depends(get_async_session)],
+):
+    snapshot = await index_holder.get()
+    if snapshot is None:
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, detail="Recommendation index is not built yet")
+
+    cached = similar_cache.get((yt_id, snapshot.version))
+    if cached is not None:
+        similar_cache_requests.inc(result="hit")
+        return cached
+    similar_cache_requests.inc(result="miss")
+
+    service = RecomendationService()
+    try:
+        similar = await asyncio.to_thread(
+            service.similar_tracks,
+            yt_id,
+            snapshot.index,
+            snapshot.ids,
+            top_n=Config.SIMILAR_TRACKS_TOP_N,
+            neighbors=snapshot.neighbors,
+        )
+    except IndexServerError as e:
+        logger.error(f"❌ Similar tracks for {yt_id} failed: {e}")
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, detail="Recommendation index is unavailable")
+    if similar is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Track is not in the recommendation index")
+
+    # Метаданные всех найденных треков одним запросом
+    tracks = []
+    if similar:
+        tracks = await crud_track.get_many_by_ids(db_session, [track_id for track_id, _ in similar], "yt_id")
+    by_yt_id = {track.yt_id: track for track in tracks}
+    result = []
+    for track_id, score in similar:
+        track = by_yt_id.get(track_id)
+        if track is not None:
+            track.score = score
+            result.append(TrackRecommendRead.model_validate(track))
+
+    similar_cache.put((yt_id, snapshot.version), result)
+    return result
+
+
 @router.post("/track/stat", status_code=200)
 async def add_listen(
     yt_id: UUID_,
@@ -299,7 +366,10 @@ async def add_track_to_playlist(
         playlist_id=playlist.id, track_id=track.id, position=playlist.tracks_amount + 1
     )
     await crud_playlist_track.create(db_session, playlist_track)
-    await crud_playlist.update_by_id(db_session, PlaylistUpdate(tracks_amount=playlist.tracks_amount + 1), playlist.id)
+    await crud_playlist.change_tracks(db_session, playlist.id, 1)
+    # Признаки нового трека учтутся при сверке после анализа
+    await crud_playlist_embedding.apply_track(db_session, playlist.id, track.id)
+    invalidate_recommendations(playlist.id)
     logger.info(f"user: {user.username} | add track: {track.yt_id} in plst: {playlist.name}")
     return TrackRead.model_validate(track)
 
@@ -313,10 +383,11 @@ async def delete_track_from_playlist(
 ):
     playlist = await plst_owned_by_user(db_session, plst_id, user.id)
     try:
-        await crud_playlist_track.remove_by_track_and_playlist(db_session, track_id, playlist.id)
-        await crud_playlist.update_by_id(
-            db_session, PlaylistUpdate(tracks_amount=playlist.tracks_amount - 1), playlist.id
-        )
+        removed = await crud_playlist_track.remove_by_track_and_playlist(db_session, track_id, playlist.id)
+        await crud_playlist.change_tracks(db_session, playlist.id, -1)
+        if removed:
+            await crud_playlist_embedding.apply_track(db_session, playlist.id, track_id, weight=-removed)
+        invalidate_recommendations(playlist.id)
         logger.info(f"user: {user.username} | remove track: {track_id} from plst: {playlist.name}")
     except NotFoundException:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
@@ -357,26 +428,56 @@ async def swap_tracks_positions(
 @router.get("/playlists/{plst_id}/recommendations", status_code=status.HTTP_200_OK)
 async def playlist_recomendations(
     plst_id: UUID,
+    response: Response,
     user: Annotated[User, Depends(auth_handler.get_current_user)],
     db_session: Annotated[AsyncSession, Depends(get_async_session)],
+    quality: str | None = None,
 ):
+    if quality is not None and quality not in tier_selector.tiers:
+        raise HTTPException(
+            status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Unknown quality, expected one of {tier_selector.order}"
+        )
     try:
         playlist = await plst_owned_by_user(db_session, plst_id, user.id)
-        features = await crud_features.get_by_playlist(db_session, playlist.id)
-        playlist_features = list(features)
-
-        model = Index(space="cosine", dim=60)
-        model.load_index("recommendations_cache/index.bin")
-
-        id_lookup: dict[int, str] = {}
-        with open("recommendations_cache/id_lookup.json", "r") as f:
-            id_lookup_raw = json.loads(f.read())
-            id_lookup = {int(k): v for k, v in id_lookup_raw.items()}
+        snapshot = await index_holder.get()
+        if snapshot is None:
+            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, detail="Recommendation index is not built yet")
+
+        # Под нагрузкой уровень может оказаться дешевле запрошенного: отдаём выбранный в заголовке
+        tier = tier_selector.choose(quality)
+        response.headers["X-Recommendation-Tier"] = tier.name
+
+        # Запись действительна, пока не изменились состав плейлиста (revision) и индекс
+        stamp = (playlist.revision, snapshot.version)
+        cached = recommendation_cache.get((playlist.id, tier.name))
+        if cached is not None and cached[0] == stamp:
+            recommendation_cache_requests.inc(result="hit")
+            return cached[1]
+        recommendation_cache_requests.inc(result="miss")
+
+        # Этап 1 - по сохранённому вектору плейлиста, этап 2 - по векторам треков из индекса
+        embedding = await crud_playlist_embedding.get_by_playlist(db_session, playlist.id)
+        if not embedding.track_count:
+            raise NotFoundException(f"Not found tracks features for playlist id: {playlist.id}")
+        playlist_ids = await crud_playlist_track.get_yt_ids(db_session, playlist.id)
 
         service = RecomendationService()
-        playlist_recomendations = service.recommend_tracks_for_playlist(
-            playlist_features, model, id_lookup, with_scores=True
+        started = time.perf_counter()
+        # kNN отпускает GIL: считаем в потоке, не блокируя event loop
+        playlist_recomendations = await asyncio.to_thread(
+            service.recommend_for_embedding,
+            embedding.mean_vector,
+            playlist_ids,
+            snapshot.index,
+            snapshot.ids,
+            with_scores=True,
+            projection=snapshot.projection,
+            neighbors_per_track=tier.neighbors,
+            pool_factor=tier.pool,
+            ef=tier.ef,
+            neighbors=snapshot.neighbors,
         )
+        tier_selector.observe(tier, time.perf_counter() - started)
         tracks = await crud_track.get_many_by_ids(db_session, [item[0] for item in playlist_recomendations], "yt_id")
 
         result = []
@@ -386,6 +487,11 @@ async def playlist_recomendations(
             track.score = item[1]
             result.append(track)
         logger.info(f"user: {user.username} | get recommendations for plst: {playlist.name}")
-        return [TrackRecommendRead.model_validate(track) for track in result]
+        recommendations = [TrackRecommendRead.model_validate(track) for track in result]
+        recommendation_cache.put((playlist.id, tier.name), (stamp, recommendations))
+        return recommendations
+    except IndexServerError as e:
+        logger.error(f"❌ Recommendations for plst {plst_id} failed: {e}")
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, detail="Recommendation index is unavailable")
     except NotFoundException:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
@@ -59,6 +59,7 @@ class TrackCreate(BaseModel):
     title: str
     artist: str
     duration: int
+    source_uri: str | None = None
 
 
 class TrackRead(BaseModel):
@@ -146,6 +147,7 @@ class HistoryRead(BaseModel):
 
 class TrackFeatures(BaseModel):
     yt_id: str
+    extractor_version: int
 
     chroma_mean: float
     chroma_var: float
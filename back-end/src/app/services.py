@@ -1,8 +1,9 @@
 from datetime import datetime
 import re
-import io
-import json
+import os
+import time
 from collections import Counter, namedtuple
+from functools import partial
 from typing import List
 from urllib.parse import urlparse, parse_qs
 from uuid import UUID
@@ -14,21 +15,37 @@ from loguru import logger
 import librosa as lr
 import numpy as np
 from sklearn.preprocessing import normalize
-import soundfile as sf
-from pytubefix import YouTube as YT
-from pydub import AudioSegment
-from sklearn.neighbors import NearestNeighbors
 from hnswlib import Index
 from sqlalchemy import and_, func, outerjoin, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.config import Config
 from src.repository import NotFoundException
-from src.app.models import StatUserhistory, Track, crud_playlist, TrackFeature
+from src.app.audio_cache import audio_cache
+from src.app.decoding import SAMPLE_RATE
+from src.app.sources import get_source, youtube_source
+from src.app.id_table import EMPTY, YT_ID_DTYPE, IdTable
+from src.app.index_store import IndexSnapshot, save_snapshot
+from src.app.profiling import StageTimer
+from src.app.neighbors import NeighborTable
+from src.app.projection import Projection
+from src.app.streaming import (
+    N_FFT,
+    N_MELS,
+    extract_excerpts,
+    extract_streaming,
+    iter_array_blocks,
+    iter_file_blocks,
+)
+from src.app.models import FeatureMatrix, StatUserhistory, Track, crud_playlist, TrackFeature
 
 
-TrackMeta = namedtuple("TrackDTO", ["yt_id", "title", "duration", "artist"])
 AudioData = namedtuple("AudioDataDTO", ["audio_data", "sr"])
 
+# Версия извлечения признаков: увеличивать при любом изменении набора или расчёта признаков,
+# строки track_features со старой версией пересчитываются задачей reanalyze_stale_tracks
+EXTRACTOR_VERSION = 1
+
 
 async def plst_owned_by_user(db_session, plst_id: UUID, user_id: UUID):
     try:
@@ -89,114 +106,196 @@ class YTService:
 
     @classmethod
     def get_basic_track_details(cls, yt_id: str) -> Track:
-        track_data = YT.from_id(yt_id)
-        track = Track(yt_id=yt_id, title=track_data.title, duration=track_data.length, artist=track_data.author)
-
-        return track
+        return Track(**youtube_source.details(yt_id)._asdict())
 
 
 class RecomendationService:
-    def get_sample_features(self, track: AudioData) -> dict[str, float | str]:
-        """Извлекает признаки из аудиофайла с оптимизациями"""
+    def get_sample_features(self, track: AudioData, timer: StageTimer | None = None) -> dict[str, float | str]:
+        """Извлекает признаки из аудиофайла с оптимизациями
+
+        Все спектральные признаки считаются из одного STFT: из него же берутся мощность,
+        мел-спектр (онсеты/темп и энтропия) и HPSS, поэтому сигнал проходит через
+        прямое преобразование один раз. Время каждого этапа пишется в ``timer``.
+        """
         audio_data, sr = track.audio_data, track.sr
+        timer = timer or StageTimer()
         features = {}
 
-        # Предобработка: trim + STFT
-        y, _ = lr.effects.trim(audio_data)
-        S = np.abs(lr.stft(y))
-        S_db = lr.power_to_db(S**2)
+        # Предобработка: trim + единый STFT
+        with timer.stage("trim"):
+            y, _ = lr.effects.trim(audio_data)
+        with timer.stage("stft"):
+            D = lr.stft(y)
+            S = np.abs(D)
+            power = S**2
+        with timer.stage("mel"):
+            mel_basis = lr.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS)
+            mel = mel_basis @ S
+            mel_power = mel_basis @ power
 
         # 1. Стандартные признаки
-        features["chroma_mean"] = lr.feature.chroma_stft(S=S, sr=sr).mean()
-        features["chroma_var"] = lr.feature.chroma_stft(S=S, sr=sr).var()
-        features["rms_mean"] = lr.feature.rms(S=S).mean()
-        features["rms_var"] = lr.feature.rms(S=S).var()
-        spectral_centroids = lr.feature.spectral_centroid(S=S, sr=sr)
-        features["spectral_centroids_mean"] = spectral_centroids.mean()
-        features["spectral_centroids_var"] = spectral_centroids.var()
-        spectral_bandwidth = lr.feature.spectral_bandwidth(S=S, sr=sr)
-        features["spectral_bandwidth_mean"] = spectral_bandwidth.mean()
-        features["spectral_bandwidth_var"] = spectral_bandwidth.var()
-        spectral_rolloff = lr.feature.spectral_rolloff(S=S, sr=sr)
-        features["spectral_rolloff_mean"] = spectral_rolloff.mean()
-        features["spectral_rolloff_var"] = spectral_rolloff.var()
-        spectral_contrast = lr.feature.spectral_contrast(S=S, sr=sr)
-        features["spectral_contrast_mean"] = spectral_contrast.mean()
-        features["spectral_contrast_var"] = spectral_contrast.var()
-        zcr = lr.feature.zero_crossing_rate(y)
-        features["zero_crossing_rate_mean"] = zcr.mean()
-        features["zero_crossing_rate_var"] = zcr.var()
-        tempo, _ = lr.beat.beat_track(y=y, sr=sr)
-        features["tempo"] = tempo
+        with timer.stage("chroma"):
+            chroma = lr.feature.chroma_stft(S=S, sr=sr)
+            features["chroma_mean"] = chroma.mean()
+            features["chroma_var"] = chroma.var()
+        with timer.stage("spectral"):
+            rms = lr.feature.rms(S=S)
+            features["rms_mean"] = rms.mean()
+            features["rms_var"] = rms.var()
+            spectral_centroids = lr.feature.spectral_centroid(S=S, sr=sr)
+            features["spectral_centroids_mean"] = spectral_centroids.mean()
+            features["spectral_centroids_var"] = spectral_centroids.var()
+            spectral_bandwidth = lr.feature.spectral_bandwidth(S=S, sr=sr, centroid=spectral_centroids)
+            features["spectral_bandwidth_mean"] = spectral_bandwidth.mean()
+            features["spectral_bandwidth_var"] = spectral_bandwidth.var()
+            spectral_rolloff = lr.feature.spectral_rolloff(S=S, sr=sr)
+            features["spectral_rolloff_mean"] = spectral_rolloff.mean()
+            features["spectral_rolloff_var"] = spectral_rolloff.var()
+            spectral_contrast = lr.feature.spectral_contrast(S=S, sr=sr)
+            features["spectral_contrast_mean"] = spectral_contrast.mean()
+            features["spectral_contrast_var"] = spectral_contrast.var()
+            # Спектральная плоскостность (шумность)
+            flatness = lr.feature.spectral_flatness(S=S)
+            features["spectral_flatness_mean"] = flatness.mean()
+            features["spectral_flatness_var"] = flatness.var()
+        with timer.stage("zcr"):
+            zcr = lr.feature.zero_crossing_rate(y)
+            features["zero_crossing_rate_mean"] = zcr.mean()
+            features["zero_crossing_rate_var"] = zcr.var()
+        with timer.stage("beat"):
+            # Огибающая онсетов из того же мел-спектра, что и в beat_track(y=...)
+            onset_envelope = lr.onset.onset_strength(S=lr.power_to_db(mel_power), sr=sr, aggregate=np.median)
+            tempo, _ = lr.beat.beat_track(onset_envelope=onset_envelope, sr=sr)
+            features["tempo"] = tempo
 
         # 2. MFCCs
-        mfcc = lr.feature.mfcc(S=S_db, sr=sr, n_mfcc=20)
-        for i in range(20):
-            features[f"mfcc_{i + 1}_mean"] = mfcc[i].mean()
-            features[f"mfcc_{i + 1}_var"] = mfcc[i].var()
+        with timer.stage("mfcc"):
+            S_db = lr.power_to_db(power)
+            mfcc = lr.feature.mfcc(S=S_db, sr=sr, n_mfcc=20)
+            means = mfcc.mean(axis=1)
+            variances = mfcc.var(axis=1)
+            for i in range(20):
+                features[f"mfcc_{i + 1}_mean"] = means[i]
+                features[f"mfcc_{i + 1}_var"] = variances[i]
 
         # 3. Дополнительные признаки
 
-        # Спектральная плоскостность (шумность)
-        flatness = lr.feature.spectral_flatness(S=S)
-        features["spectral_flatness_mean"] = flatness.mean()
-        features["spectral_flatness_var"] = flatness.var()
-
-        # Гармоническая и перкуссионная энергия
-        harmonic, percussive = lr.effects.hpss(y)
-        features["harmonic_energy"] = np.mean(np.abs(harmonic))
-        features["percussive_energy"] = np.mean(np.abs(percussive))
-        features["harmonic_percussive_ratio"] = features["harmonic_energy"] / (features["percussive_energy"] + 1e-6)
+        # Гармоническая и перкуссионная энергия: HPSS по уже готовой спектрограмме
+        with timer.stage("hpss"):
+            D_harmonic, D_percussive = lr.decompose.hpss(D)
+            harmonic = lr.istft(D_harmonic, length=len(y))
+            percussive = lr.istft(D_percussive, length=len(y))
+            features["harmonic_energy"] = np.mean(np.abs(harmonic))
+            features["percussive_energy"] = np.mean(np.abs(percussive))
+            features["harmonic_percussive_ratio"] = features["harmonic_energy"] / (
+                features["percussive_energy"] + 1e-6
+            )
 
         # Энтропия мелспектра
-        mel = lr.feature.melspectrogram(y=y, sr=sr, S=S, n_mels=128)
-        mel_norm = mel / (mel.sum(axis=0, keepdims=True) + 1e-6)
-        entropy = -np.sum(mel_norm * np.log(mel_norm + 1e-6), axis=0)
-        features["mel_entropy_mean"] = entropy.mean()
-        features["mel_entropy_var"] = entropy.var()
+        with timer.stage("mel_entropy"):
+            mel_norm = mel / (mel.sum(axis=0, keepdims=True) + 1e-6)
+            entropy = -np.sum(mel_norm * np.log(mel_norm + 1e-6), axis=0)
+            features["mel_entropy_mean"] = entropy.mean()
+            features["mel_entropy_var"] = entropy.var()
 
         return features
 
-    def download_audio(self, yt_id: str) -> AudioData | None:
-        SR = 22050
-        try:
-            yt = YT.from_id(yt_id)
-            audio_stream = yt.streams.filter(only_audio=True).first()
-            if not audio_stream:
-                logger.error(f"Not available streams for: {yt_id}")
-                return None
-
-            logger.info(f"🔽 Download: {yt.title}")
-            with io.BytesIO() as memory_file:
-                audio_stream.stream_to_buffer(memory_file)
-                memory_file.seek(0)
+    def get_sample_features_streaming(
+        self, path: str, sr: int = SAMPLE_RATE, timer: StageTimer | None = None
+    ) -> dict[str, float | str]:
+        """Те же признаки, что и get_sample_features, но блоками из f32le-файла с ограниченной памятью"""
+        return extract_streaming(partial(iter_file_blocks, path), sr, timer)
 
-                ext = audio_stream.subtype.lower()
-                format_map = {
-                    "m4a": "mp4",
-                    "webm": "webm",
-                    "mp4": "mp4",
-                    "mp3": "mp3",
-                }
-                fmt = format_map.get(ext, ext)
-
-                audio: AudioSegment = AudioSegment.from_file(memory_file, format=fmt)
-                audio = audio.set_frame_rate(SR).set_channels(1).set_sample_width(2)
-
-                with io.BytesIO() as raw_buffer:
-                    audio.export(raw_buffer, format="wav")
-                    raw_buffer.seek(0)
+    def get_sample_features_fast(
+        self,
+        track: AudioData | str,
+        excerpts: int,
+        seconds: float,
+        timer: StageTimer | None = None,
+    ) -> dict[str, float | str]:
+        """Быстрый профиль: признаки по ``excerpts`` окнам, из памяти или из f32le-файла"""
+        if isinstance(track, str):
+            blocks, sr = partial(iter_file_blocks, track), SAMPLE_RATE
+        else:
+            blocks, sr = partial(iter_array_blocks, track.audio_data), track.sr
+        return extract_excerpts(blocks, sr, excerpts, seconds, timer)
+
+    def download_audio_file(
+        self,
+        yt_id: str,
+        directory: str,
+        max_duration: int | None = None,
+        uri: str | None = None,
+        timer: StageTimer | None = None,
+    ) -> str | None:
+        """Скачивает трек и декодирует его в сырой f32le-файл (моно, SAMPLE_RATE), минуя память
+
+        Возвращает путь к файлу: запись audio_cache, если кэш включён, иначе файл в ``directory``.
+        """
+        timer = timer or StageTimer()
+        source = get_source(yt_id)
+        use_cache = source.cacheable and audio_cache.enabled
+        if use_cache:
+            with timer.stage("cache_read"):
+                cached = audio_cache.get_path(yt_id, max_duration)
+            if cached:
+                logger.info(f"💾 Audio cache hit: {yt_id}")
+                timer.count("cache_hit")
+                return cached
+
+        path = audio_cache.temp_path(yt_id) if use_cache else os.path.join(directory, f"{yt_id}.f32")
+        try:
+            started = time.perf_counter()
+            source.decode(yt_id, uri, path=path, max_duration=max_duration, timer=timer)
+            samples = os.path.getsize(path) // np.dtype(np.float32).itemsize
+            elapsed = time.perf_counter() - started
+            logger.info(f"✅ Downloaded and decoded {samples / SAMPLE_RATE:.0f}s in {elapsed:.2f}s")
 
-                    data, samplerate = sf.read(raw_buffer)
+            if use_cache:
+                with timer.stage("cache_write"):
+                    path = audio_cache.put_file(yt_id, path, max_duration)
+            return path
 
-                # Если нужно точно SR=22050, ресемплируем
-                if samplerate != SR:
-                    import librosa
+        except Exception as e:
+            if use_cache and os.path.exists(path):
+                os.remove(path)
+            logger.error(f"❌ Error on process {yt_id}: {e}")
+            return None
 
-                    data = librosa.resample(data.T, orig_sr=samplerate, target_sr=SR).T
-                    samplerate = SR
+    def download_audio(
+        self,
+        yt_id: str,
+        max_duration: int | None = None,
+        uri: str | None = None,
+        timer: StageTimer | None = None,
+    ) -> AudioData | None:
+        """Скачивает трек и сразу декодирует его ffmpeg-ом в моно float32 SAMPLE_RATE
+
+        Декодирование идёт по мере скачивания, без копий PCM в BytesIO/WAV и без ресемплинга в python.
+        Уже декодированные треки берутся из audio_cache без обращения к YouTube.
+        """
+        timer = timer or StageTimer()
+        source = get_source(yt_id)
+        use_cache = source.cacheable and audio_cache.enabled
+        if use_cache:
+            with timer.stage("cache_read"):
+                cached = audio_cache.get(yt_id, max_duration)
+            if cached is not None:
+                logger.info(f"💾 Audio cache hit: {yt_id} ({len(cached) / SAMPLE_RATE:.0f}s)")
+                timer.count("cache_hit")
+                return AudioData(cached, SAMPLE_RATE)
 
-                return AudioData(data, samplerate)
+        try:
+            started = time.perf_counter()
+            audio_data = source.decode(yt_id, uri, max_duration=max_duration, timer=timer)
+            logger.info(
+                f"✅ Downloaded and decoded {len(audio_data) / SAMPLE_RATE:.0f}s "
+                f"({audio_data.nbytes / 2**20:.1f} MiB PCM) in {time.perf_counter() - started:.2f}s"
+            )
+            if use_cache:
+                with timer.stage("cache_write"):
+                    audio_cache.put(yt_id, audio_data, max_duration)
+            return AudioData(audio_data, SAMPLE_RATE)
 
         except Exception as e:
             logger.error(f"❌ Error on process {yt_id}: {e}")
@@ -206,29 +305,151 @@ class RecomendationService:
         self,
         playlist: List[TrackFeature],
         model: Index,
-        id_lookup: dict[int, str],
+        ids: IdTable,
         top_n: int = 10,
         diversity_k: int = 2,
         neighbors_per_track: int = 5,
         with_scores: bool = False,
+        projection: Projection | None = None,
+        pool_factor: int = 5,
+        ef: int = 0,
     ) -> list[str] | list[tuple[str, float]]:
+        """``ef`` - ширина поиска HNSW для запроса (0 - ef индекса), ``top_n * pool_factor`` - кандидатов этапа 1"""
         if not playlist:
             return []
 
         playlist_vectors = np.array([track.as_vector() for track in playlist])
-        mean_vector = normalize([playlist_vectors.mean(axis=0)])
+        return self._recommend(
+            self.index_vectors([playlist_vectors.mean(axis=0)], projection),
+            self._track_neighbors(
+                model, self.index_vectors(playlist_vectors, projection), neighbors_per_track, ef, len(ids)
+            ),
+            set(track.yt_id for track in playlist),
+            model,
+            ids,
+            top_n,
+            diversity_k,
+            with_scores,
+            pool_factor,
+            ef,
+        )
+
+    def recommend_for_embedding(
+        self,
+        embedding: list[float] | np.ndarray,
+        playlist_ids: list[str],
+        model: Index,
+        ids: IdTable,
+        top_n: int = 10,
+        diversity_k: int = 2,
+        neighbors_per_track: int = 5,
+        with_scores: bool = False,
+        projection: Projection | None = None,
+        pool_factor: int = 5,
+        ef: int = 0,
+        neighbors: NeighborTable | None = None,
+    ) -> list[str] | list[tuple[str, float]]:
+        """То же по сохранённому вектору плейлиста (playlist_embeddings), без признаков его треков
+
+        Соседи треков для этапа 2 берутся из таблицы ``neighbors``, если в ней не меньше
+        ``neighbors_per_track`` соседей, иначе - запросом к индексу по векторам треков из
+        самого индекса. Треки, ещё не попавшие в индекс, участвуют только в этапе 1.
+        """
+        if not playlist_ids:
+            return []
 
+        labels = ids.labels_of(playlist_ids)
+        labels = labels[labels >= 0]
+        if neighbors is not None and neighbors.k >= neighbors_per_track:
+            neighbor_labels = neighbors.lookup(labels, neighbors_per_track)
+        elif len(labels):
+            track_vectors = model.get_items(labels, return_type="numpy")
+            neighbor_labels = self._track_neighbors(model, track_vectors, neighbors_per_track, ef, len(ids))
+        else:
+            neighbor_labels = np.empty(0, dtype=np.int64)
+        return self._recommend(
+            self.index_vectors([embedding], projection),
+            neighbor_labels,
+            set(playlist_ids),
+            model,
+            ids,
+            top_n,
+            diversity_k,
+            with_scores,
+            pool_factor,
+            ef,
+        )
+
+    def similar_tracks(
+        self,
+        yt_id: str,
+        model: Index,
+        ids: IdTable,
+        top_n: int = 10,
+        neighbors: NeighborTable | None = None,
+    ) -> list[tuple[str, float]] | None:
+        """Ближайшие к треку треки индекса с оценкой в процентах; None - трека нет в индексе
+
+        При таблице ``neighbors`` хотя бы на ``top_n + 1`` соседей (первый - сам трек) kNN-запроса
+        нет: оценки считаются по векторам из индекса, которые в cosine-пространстве нормированы.
+        """
+        label = int(ids.labels_of([yt_id])[0])
+        if label < 0:
+            return None
+
+        if neighbors is not None and neighbors.k > top_n:
+            found = neighbors.lookup([label], neighbors.k)
+            # Строка не пересчитывается при удалении соседей: get_items на удалённой метке падает
+            found = found[np.array(ids.lookup(found), dtype=object) != ""]
+            vectors = model.get_items(np.concatenate([[label], found]), return_type="numpy")
+            distances = 1.0 - vectors[1:] @ vectors[0]
+        else:
+            vector = model.get_items([label], return_type="numpy")
+            found, distances = self.knn_query(model, vector, top_n + 1, count=len(ids))
+            found, distances = found[0], distances[0]
+
+        result = []
+        for track_id, dist in zip(ids.lookup(found), np.asarray(distances).tolist()):
+            if track_id and track_id != yt_id:
+                result.append((track_id, round(max(0.0, 1.0 - dist / 2.0) * 100, 2)))
+            if len(result) >= top_n:
+                break
+        return result
+
+    def _track_neighbors(
+        self, model: Index, track_vectors: np.ndarray, neighbors_per_track: int, ef: int, count: int
+    ) -> np.ndarray:
+        """Соседи треков плейлиста для этапа 2 одним пакетным запросом (hnswlib раскидывает строки по потокам)"""
+        if not len(track_vectors):
+            return np.empty(0, dtype=np.int64)
+        k2 = min(neighbors_per_track, count)
+        labels, _ = self.knn_query(model, track_vectors, k2, ef, count)
+        return labels.ravel()
+
+    def _recommend(
+        self,
+        mean_vector: np.ndarray,
+        neighbor_labels: np.ndarray,
+        playlist_ids: set[str],
+        model: Index,
+        ids: IdTable,
+        top_n: int,
+        diversity_k: int,
+        with_scores: bool,
+        pool_factor: int,
+        ef: int,
+    ) -> list[str] | list[tuple[str, float]]:
+        """Средний вектор плейлиста - в пространстве индекса, ``neighbor_labels`` - соседи его треков подряд"""
         # --- Этап 1: по усреднённому вектору ---
-        k1 = min(top_n * 5, model.get_current_count())
-        mood_labels, distances = model.knn_query(mean_vector, k=k1)
+        k1 = min(top_n * pool_factor, len(ids))
+        mood_labels, distances = self.knn_query(model, mean_vector, k1, ef, len(ids))
 
-        playlist_ids = set(track.yt_id for track in playlist)
         recommended: list[str] = []
         scores: dict[str, float] = {}
 
-        for idx, dist in zip(mood_labels[0], distances[0]):
-            track_id = id_lookup.get(idx, "")
-            if track_id not in playlist_ids and track_id not in recommended:
+        # Метки результата переводятся в yt_id одной выборкой из таблицы id
+        for track_id, dist in zip(ids.lookup(mood_labels[0]), distances[0].tolist()):
+            if track_id not in playlist_ids and track_id not in scores:
                 recommended.append(track_id)
                 similarity = max(0.0, 1.0 - dist / 2.0)  # cosine ∈ [0,2]
                 scores[track_id] = round(similarity * 100, 2)  # проценты
@@ -236,19 +457,12 @@ class RecomendationService:
                 break
 
         # --- Этап 2: разнообразие через голосование ---
-        vote_counter = Counter()
-        for track in playlist:
-            vector = normalize([track.as_vector()])
-            k2 = min(neighbors_per_track, model.get_current_count())
-            labels, _ = model.knn_query(vector, k=k2)
-            for idx in labels[0]:
-                track_id = id_lookup.get(idx)
-                if track_id and track_id not in playlist_ids:
-                    vote_counter[track_id] += 1
+        vote_counter = Counter(np.asarray(neighbor_labels).tolist())
+        voted = ids.lookup([idx for idx, _ in vote_counter.most_common()])
 
         diversity_part = []
-        for track_id, _ in vote_counter.most_common():
-            if track_id not in recommended:
+        for track_id in voted:
+            if track_id and track_id not in playlist_ids and track_id not in scores:
                 diversity_part.append(track_id)
             if len(diversity_part) >= diversity_k:
                 break
@@ -258,24 +472,167 @@ class RecomendationService:
             return [(track_id, scores.get(track_id, 0.0)) for track_id in full_list]
         return full_list
 
-    def build_recommendation_index(self, tracks: list[TrackFeature]):
-        if not tracks:
+    @staticmethod
+    def _watermark(matrix: FeatureMatrix, previous: str | None = None) -> str | None:
+        """Самый поздний updated_at среди строк, попавших в индекс"""
+        stamps = [max(matrix.stamps).isoformat()] if matrix.stamps else []
+        if previous:
+            stamps.append(previous)
+        return max(stamps, default=None)
+
+    @staticmethod
+    def knn_query(
+        model: Index, vectors: np.ndarray, k: int, ef: int = 0, count: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """kNN с шириной поиска ef только для этого запроса
+
+        set_ef меняет общий для всех потоков индекс, поэтому ef задаётся через k: hnswlib ищет
+        с шириной max(ef индекса, k), и из max(k, ef) найденных берутся первые k.
+        ``count`` - живых элементов (len таблицы id): get_current_count учитывает и помеченные
+        mark_deleted, а больше живых hnswlib вернуть не может.
+        """
+        wide = min(max(k, ef), model.get_current_count() if count is None else count)
+        labels, distances = model.knn_query(vectors, k=wide, num_threads=Config.KNN_THREADS)
+        return labels[:, :k], distances[:, :k]
+
+    @staticmethod
+    def neighbors_ef() -> int:
+        """Таблица соседей считается один раз на сборку - с шириной поиска лучшего уровня качества"""
+        return max((tier["ef"] for tier in Config.RECOMMEND_TIERS.values()), default=0)
+
+    @staticmethod
+    def index_vectors(vectors, projection: Projection | None = None) -> np.ndarray:
+        """Признаки -> векторы в пространстве индекса: нормировка (cosine) и проекция, если есть"""
+        vectors = normalize(vectors)
+        return vectors if projection is None else projection.transform(vectors)
+
+    @staticmethod
+    def create_index(
+        vectors: np.ndarray,
+        labels: np.ndarray,
+        M: int = Config.INDEX_M,
+        ef_construction: int = Config.INDEX_EF_CONSTRUCTION,
+        num_threads: int = Config.INDEX_BUILD_THREADS,
+    ) -> Index:
+        index = Index(space="cosine", dim=vectors.shape[1])
+        capacity = int(len(labels) * (1 + Config.INDEX_HEADROOM))
+        index.init_index(max_elements=capacity, ef_construction=ef_construction, M=M)
+        index.add_items(vectors, labels, num_threads=num_threads)
+        return index
+
+    def build_recommendation_index(
+        self,
+        matrix: FeatureMatrix,
+        dim: int = Config.INDEX_PCA_DIM,
+        fingerprint: str | None = None,
+        timer: StageTimer | None = None,
+    ) -> str | None:
+        """Полная сборка; при 0 < dim < числа признаков индекс строится по PCA-проекции в dim измерений
+
+        ``fingerprint`` таблицы признаков (crud_features.fingerprint) сохраняется в meta снимка,
+        время этапов prepare, add_items, neighbors и save пишется в ``timer``.
+        """
+        if not matrix.yt_ids:
             logger.warning("⚠  No track to build index.")
-            return
-        vectors = np.array([t.as_vector() for t in tracks])
-        vectors = normalize(vectors)  # cosine
+            return None
 
-        ids = np.arange(len(tracks), dtype=np.int64)
-        id_lookup = {i: str(t.yt_id) for i, t in enumerate(tracks)}
+        timer = timer or StageTimer()
+        with timer.stage("prepare"):
+            projection = None
+            if 0 < dim < matrix.vectors.shape[1]:
+                projection, retained = Projection.fit(matrix.vectors, dim)
+                logger.info(f"📐 Projection {matrix.vectors.shape[1]} -> {dim} dims retains {retained:.1%} of energy")
+            vectors = self.index_vectors(matrix.vectors, projection)
+
+            ids = np.arange(len(matrix.yt_ids), dtype=np.int64)
+            id_table = IdTable.from_ids(matrix.yt_ids)
 
         logger.info("✅ Data prepare complete. Build index...")
-        index = Index(space="cosine", dim=vectors.shape[1])
-        index.init_index(max_elements=len(tracks), ef_construction=200, M=16)
-        index.add_items(vectors, ids)
+        with timer.stage("add_items"):
+            index = self.create_index(vectors, ids)
+        seconds = timer.stages["add_items"]
+        logger.info(
+            f"🏗  Index of {len(ids)} vectors built in {seconds:.2f}s ({len(ids) / max(seconds, 1e-9):,.0f} vectors/s, "
+            f"threads: {Config.INDEX_BUILD_THREADS})"
+        )
+
+        neighbors = None
+        if Config.INDEX_NEIGHBORS > 0:
+            with timer.stage("neighbors"):
+                neighbors = NeighborTable.build(index, vectors, ids, Config.INDEX_NEIGHBORS, ef=self.neighbors_ef())
+            logger.info(
+                f"🧭 Neighbor table ({Config.INDEX_NEIGHBORS} per track) built in {timer.stages['neighbors']:.2f}s"
+            )
 
         logger.info("✅Index build complete. Save results...")
-        index.save_index("recommendations_cache/index.bin")
+        meta = {"watermark": self._watermark(matrix), "next_label": len(ids), "deleted": 0, "fingerprint": fingerprint}
+        with timer.stage("save"):
+            version = save_snapshot(index, id_table, meta, projection, neighbors)
+        logger.info(f"✅ Result seved. Index version: {version}")
+        return version
+
+    def update_recommendation_index(
+        self,
+        snapshot: IndexSnapshot,
+        changed: FeatureMatrix,
+        live_ids: set[str],
+        fingerprint: str | None = None,
+    ) -> str | None:
+        """Инкрементально обновляет снимок: новые и пересчитанные строки, удалённые треки
+
+        Метки треков стабильны: пересчитанный трек обновляется по своей метке, новый получает
+        next_label, удалённый помечается mark_deleted. Возвращает новую версию или None,
+        если удалённых стало больше INDEX_MAX_DELETED_FRACTION и нужна полная пересборка.
+        """
+        index, meta = snapshot.index, dict(snapshot.meta)
+        # Копия в памяти: таблица снимка открыта через memory-map только на чтение
+        ids = np.array(snapshot.ids.ids, dtype=YT_ID_DTYPE)
+
+        removed = np.flatnonzero((ids != EMPTY) & ~np.isin(ids, np.array(list(live_ids), dtype=YT_ID_DTYPE)))
+        deleted = meta.get("deleted", 0) + len(removed)
+        if deleted / max(index.get_current_count(), 1) > Config.INDEX_MAX_DELETED_FRACTION:
+            logger.info(f"♻  {deleted} of {index.get_current_count()} index entries are deleted, full rebuild needed")
+            return None
 
-        with open("recommendations_cache/id_lookup.json", "w") as f:
-            json.dump(id_lookup, f)
-        logger.info("✅ Result seved.")
+        for label in removed.tolist():
+            index.mark_deleted(label)
+        ids[removed] = EMPTY
+
+        # Трек, удалённый в этом же обновлении, как и новый, получает следующую свободную метку
+        changed_labels = snapshot.ids.labels_of(changed.yt_ids)
+        new = (changed_labels < 0) | np.isin(changed_labels, removed)
+        added = int(new.sum())
+        next_label = max(meta.get("next_label", len(ids)), len(ids))
+        changed_labels[new] = np.arange(next_label, next_label + added)
+        next_label += added
+        if added:
+            ids = np.concatenate([ids, np.zeros(next_label - len(ids), dtype=YT_ID_DTYPE)])
+            ids[changed_labels[new]] = np.array(changed.yt_ids, dtype=YT_ID_DTYPE)[new]
+
+        vectors = np.empty((0, index.dim), dtype=np.float32)
+        if len(changed_labels):
+            vectors = self.index_vectors(changed.vectors, snapshot.projection)
+            needed = index.get_current_count() + added
+            if needed > index.get_max_elements():
+                index.resize_index(int(needed * (1 + Config.INDEX_HEADROOM)))
+            index.add_items(vectors, changed_labels, num_threads=Config.INDEX_BUILD_THREADS)
+
+        neighbors = snapshot.neighbors
+        if neighbors is not None:
+            live = int((ids != EMPTY).sum())
+            neighbors = neighbors.update(
+                index, vectors, changed_labels, removed, next_label, live, ef=self.neighbors_ef()
+            )
+
+        meta.update(
+            watermark=self._watermark(changed, meta.get("watermark")),
+            next_label=next_label,
+            deleted=deleted,
+            fingerprint=fingerprint,
+        )
+        version = save_snapshot(index, IdTable(ids), meta, snapshot.projection, neighbors)
+        logger.info(
+            f"✅ Index updated: +{added} new, {len(changed_labels) - added} re-analyzed, {len(removed)} deleted. "
+            f"Version: {version}"
+        )
+        return version
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import subprocess
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+from pytubefix import YouTube as YT
+from pytubefix import request
+
+from src.app.decoding import SAMPLE_RATE, decode_chunks, decode_file
+from src.app.profiling import StageTimer
+
+FFPROBE = "ffprobe"
+LOCAL_PREFIX = "lc_"
+AUDIO_EXTENSIONS = {".mp3", ".m4a", ".aac", ".webm", ".opus", ".ogg", ".flac", ".wav", ".aiff", ".wma"}
+
+TrackMeta = namedtuple("TrackDTO", ["yt_id", "title", "duration", "artist"])
+
+
+class AudioSource(ABC):
+    """Источник аудио трека: метаданные и декодирование в моно float32 SAMPLE_RATE
+
+    ``uri`` - tracks.source_uri (для YouTube не нужен, трек определяется по yt_id).
+    """
+
+    # Класть ли декодированное аудио в audio_cache (локальные файлы и так читаются с диска)
+    cacheable: bool = True
+
+    @abstractmethod
+    def details(self, track_id: str, uri: str | None = None) -> TrackMeta: ...
+
+    @abstractmethod
+    def decode(
+        self,
+        track_id: str,
+        uri: str | None = None,
+        path: str | None = None,
+        max_duration: int | None = None,
+        timer: StageTimer | None = None,
+    ) -> np.ndarray | None:
+        """PCM в массив или, если задан ``path``, в f32le-файл (тогда возвращает None)
+
+        Этапы (resolve, download, decode) и скачанные байты пишутся в ``timer``.
+        """
+        ...
+
+
+class YouTubeSource(AudioSource):
+    def details(self, track_id: str, uri: str | None = None) -> TrackMeta:
+        yt = YT.from_id(track_id)
+        return TrackMeta(yt_id=track_id, title=yt.title, duration=yt.length, artist=yt.author)
+
+    def decode(
+        self,
+        track_id: str,
+        uri: str | None = None,
+        path: str | None = None,
+        max_duration: int | None = None,
+        timer: StageTimer | None = None,
+    ) -> np.ndarray | None:
+        timer = timer or StageTimer()
+        with timer.stage("resolve"):
+            yt = YT.from_id(track_id)
+            audio_stream = yt.streams.filter(only_audio=True).first()
+        if not audio_stream:
+            raise ValueError(f"Not available streams for: {track_id}")
+
+        logger.info(f"🔽 Download: {yt.title}")
+        duration = min(yt.length, max_duration) if max_duration else yt.length
+        return decode_chunks(
+            request.stream(audio_stream.url),
+            path=path,
+            max_duration=max_duration,
+            expected_samples=int((duration + 1) * SAMPLE_RATE),
+            timer=timer,
+        )
+
+
+class LocalFileSource(AudioSource):
+    """Файлы на диске: ffmpeg читает их напрямую, без сети и промежуточной копии"""
+
+    cacheable = False
+
+    @staticmethod
+    def track_id(path: str | Path) -> str:
+        """Стабильный id локального трека, помещается в tracks.yt_id (String(25))"""
+        digest = hashlib.sha1(str(Path(path).resolve()).encode()).hexdigest()
+        return LOCAL_PREFIX + digest[: 25 - len(LOCAL_PREFIX)]
+
+    @staticmethod
+    def probe(path: str) -> dict:
+        completed = subprocess.run(
+            [FFPROBE, "-v", "error", "-show_format", "-of", "json", f"file:{path}"],
+            capture_output=True,
+            check=True,
+        )
+        return json.loads(completed.stdout).get("format", {})
+
+    def details(self, track_id: str, uri: str | None = None) -> TrackMeta:
+        if uri is None:
+            raise ValueError(f"Local track without source_uri: {track_id}")
+
+        fmt = self.probe(uri)
+        tags = {key.lower(): value for key, value in fmt.get("tags", {}).items()}
+        return TrackMeta(
+            yt_id=track_id,
+            title=tags.get("title") or Path(uri).stem,
+            duration=int(float(fmt.get("duration", 0))),
+            artist=tags.get("artist") or Path(uri).parent.name,
+        )
+
+    def decode(
+        self,
+        track_id: str,
+        uri: str | None = None,
+        path: str | None = None,
+        max_duration: int | None = None,
+        timer: StageTimer | None = None,
+    ) -> np.ndarray | None:
+        if uri is None or not os.path.isfile(uri):
+            raise ValueError(f"Local file is missing for {track_id}: {uri}")
+
+        logger.info(f"📂 Read: {uri}")
+        timer = timer or StageTimer()
+        timer.count("download_bytes", os.path.getsize(uri))
+        with timer.stage("decode"):
+            return decode_file(uri, path=path, max_duration=max_duration)
+
+
+youtube_source = YouTubeSource()
+local_source = LocalFileSource()
+
+
+def get_source(track_id: str) -> AudioSource:
+    return local_source if track_id.startswith(LOCAL_PREFIX) else youtube_source
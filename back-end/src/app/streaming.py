@@ -0,0 +1,341 @@
+from collections import namedtuple
+from typing import Callable, Iterable, Iterator
+
+import librosa as lr
+import numpy as np
+
+from src.app.profiling import StageTimer
+
+
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+N_MFCC = 20
+TOP_DB = 80.0
+TRIM_TOP_DB = 60.0
+
+# Медианный фильтр HPSS смотрит на 15 кадров в каждую сторону, ещё 2 кадра нужны ISTFT
+CONTEXT_FRAMES = 18
+BLOCK_FRAMES = 1024
+BLOCK_SAMPLES = BLOCK_FRAMES * HOP_LENGTH
+
+FrameWindow = namedtuple("FrameWindow", ["samples", "lo", "start", "stop", "length"])
+
+
+class RunningStats:
+    """Накопитель среднего и дисперсии по блокам (параллельное обновление Chan et al.)"""
+
+    def __init__(self, shape: tuple[int, ...] = ()):
+        self.count = 0
+        self.mean = np.zeros(shape, dtype=np.float64)
+        self.m2 = np.zeros(shape, dtype=np.float64)
+
+    def update(self, values: np.ndarray) -> None:
+        """Добавляет значения, время - последняя ось"""
+        n = values.shape[-1]
+        if n == 0:
+            return
+        values = values.astype(np.float64, copy=False)
+        mean = values.mean(axis=-1)
+        m2 = ((values - mean[..., None]) ** 2).sum(axis=-1)
+        self._merge(n, mean, m2)
+
+    def merge(self, other: "RunningStats") -> None:
+        if other.count:
+            self._merge(other.count, other.mean, other.m2)
+
+    def _merge(self, n: int, mean: np.ndarray, m2: np.ndarray) -> None:
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + m2 + delta**2 * (self.count * n / total)
+        self.count = total
+
+    @property
+    def var(self) -> np.ndarray:
+        return self.m2 / self.count if self.count else np.zeros_like(self.m2)
+
+
+def iter_array_blocks(audio: np.ndarray, start: int = 0, stop: int | None = None, block_size: int = BLOCK_SAMPLES):
+    stop = len(audio) if stop is None else stop
+    for offset in range(start, stop, block_size):
+        yield np.asarray(audio[offset : min(offset + block_size, stop)], dtype=np.float32)
+
+
+def iter_file_blocks(path: str, start: int = 0, stop: int | None = None, block_size: int = BLOCK_SAMPLES):
+    """Читает сырой f32le-файл (моно) блоками, не загружая его целиком"""
+    itemsize = np.dtype(np.float32).itemsize
+    with open(path, "rb") as f:
+        f.seek(start * itemsize)
+        position = start
+        while stop is None or position < stop:
+            count = block_size if stop is None else min(block_size, stop - position)
+            block = np.fromfile(f, dtype=np.float32, count=count)
+            if not block.size:
+                break
+            position += block.size
+            yield block
+
+
+def frame_windows(blocks: Iterable[np.ndarray], context: int = CONTEXT_FRAMES, block_frames: int = BLOCK_FRAMES):
+    """Режет поток сэмплов на окна кадров STFT (как при center=True) с контекстом по краям
+
+    ``samples`` начинается с кадра ``lo`` дополненного нулями сигнала, ``[start, stop)`` -
+    кадры, которые окно "владеет", ``length`` - длина сигнала (известна только в последнем окне).
+    """
+    pad = N_FFT // 2
+    buf = np.zeros(pad, dtype=np.float32)
+    buf_frame = 0
+    start = 0
+    total = 0
+
+    def window(lo: int, hi: int) -> np.ndarray:
+        return buf[(lo - buf_frame) * HOP_LENGTH : (hi - 1 - buf_frame) * HOP_LENGTH + N_FFT]
+
+    for block in blocks:
+        total += len(block)
+        buf = np.concatenate([buf, block])
+        while True:
+            available = (buf_frame * HOP_LENGTH + len(buf) - N_FFT) // HOP_LENGTH + 1
+            stop = start + block_frames
+            if stop + context > available:
+                break
+            lo = max(0, start - context)
+            yield FrameWindow(window(lo, stop + context), lo, start, stop, None)
+            start = stop
+            keep = max(0, start - context)
+            buf = buf[(keep - buf_frame) * HOP_LENGTH :]
+            buf_frame = keep
+
+    buf = np.concatenate([buf, np.zeros(pad, dtype=np.float32)])
+    n_frames = 1 + total // HOP_LENGTH
+    while start < n_frames:
+        stop = min(start + block_frames, n_frames)
+        lo = max(0, start - context)
+        yield FrameWindow(window(lo, min(n_frames, stop + context)), lo, start, stop, total)
+        start = stop
+
+
+def tempo_from_onsets(onset_envelope: np.ndarray, sr: int, chunk_frames: int = 4096) -> np.ndarray:
+    """Темп как в ``beat_track``, но темпограмма усредняется по кускам, а не строится целиком"""
+    if not onset_envelope.any():
+        return np.zeros(1)
+
+    win_length = lr.time_to_frames(8.0, sr=sr, hop_length=HOP_LENGTH).item()
+    window = lr.filters.get_window("hann", win_length, fftbins=True)[:, None]
+    n = onset_envelope.shape[-1]
+    padded = np.pad(onset_envelope, win_length // 2, mode="linear_ramp", end_values=[0, 0])
+
+    tempogram_sum = np.zeros(win_length)
+    for offset in range(0, n, chunk_frames):
+        chunk = padded[offset : min(offset + chunk_frames, n) + win_length - 1]
+        frames = lr.util.frame(chunk, frame_length=win_length, hop_length=1)
+        tempogram = lr.util.normalize(lr.autocorrelate(frames * window, axis=-2), norm=np.inf, axis=-2)
+        tempogram_sum += tempogram.sum(axis=-1)
+
+    return lr.feature.tempo(tg=(tempogram_sum / n)[:, None], sr=sr, hop_length=HOP_LENGTH)
+
+
+def excerpt_bounds(start: int, stop: int, length: int, count: int) -> list[tuple[int, int]]:
+    """``count`` окон по ``length`` сэмплов, центры равномерно разнесены по [start, stop)"""
+    if count < 1 or length < 1 or count * length >= stop - start:
+        return [(start, stop)]
+
+    step = (stop - start) / count
+    bounds = []
+    for i in range(count):
+        offset = start + int((i + 0.5) * step - length / 2)
+        offset = min(max(offset, start), stop - length)
+        bounds.append((offset, offset + length))
+    return bounds
+
+
+def trim_bounds(blocks: Iterable[np.ndarray], top_db: float = TRIM_TOP_DB) -> tuple[int, int]:
+    """Границы ``librosa.effects.trim`` за один проход: хранит только RMS по кадрам"""
+    rms = []
+    length = 0
+    for win in frame_windows(blocks, context=0):
+        frames = lr.feature.rms(y=win.samples, frame_length=N_FFT, hop_length=HOP_LENGTH, center=False)[0]
+        rms.append(frames[win.start - win.lo : win.stop - win.lo])
+        length = win.length or length
+
+    db = lr.amplitude_to_db(np.concatenate(rms), ref=np.max, top_db=None)
+    nonzero = np.flatnonzero(db > -top_db)
+    if not nonzero.size:
+        return 0, 0
+    return int(nonzero[0] * HOP_LENGTH), min(length, int((nonzero[-1] + 1) * HOP_LENGTH))
+
+
+class StreamingFeatureExtractor:
+    """Блочный аналог ``RecomendationService.get_sample_features`` с ограниченной памятью
+
+    На вход подаются блоки уже обрезанного (trim) сигнала. Покадровые признаки копятся в
+    ``RunningStats``, а между блоками хранится только контекст STFT и огибающая онсетов
+    (один float на кадр), темпограмма по ней тоже считается кусками. Расхождения с
+    пакетным путём: тональность для хромы оценивается по первому блоку, порог ``top_db``
+    считается от текущего, а не глобального максимума, края ZCR дополняются нулями.
+    """
+
+    def __init__(self, sr: int, timer: StageTimer | None = None):
+        self.sr = sr
+        self.timer = timer or StageTimer()
+        self.mel_basis = lr.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS)
+        self.tuning: float | None = None
+        self.power_peak_db = -np.inf
+        self.mel_peak_db = -np.inf
+
+        self.stats = {
+            name: RunningStats()
+            for name in (
+                "chroma",
+                "rms",
+                "spectral_centroids",
+                "spectral_bandwidth",
+                "spectral_rolloff",
+                "spectral_contrast",
+                "spectral_flatness",
+                "zero_crossing_rate",
+                "mel_entropy",
+            )
+        }
+        self.mfcc = RunningStats((N_MFCC,))
+        self.harmonic_sum = 0.0
+        self.percussive_sum = 0.0
+        self.samples = 0
+        self.onset_diffs: list[np.ndarray] = []
+        self.onset_envelopes: list[np.ndarray] = []
+
+    def _to_db(self, power: np.ndarray, peak_attr: str) -> np.ndarray:
+        db = lr.power_to_db(power, top_db=None)
+        peak = max(getattr(self, peak_attr), float(db.max()))
+        setattr(self, peak_attr, peak)
+        return np.maximum(db, peak - TOP_DB)
+
+    def process(self, win: FrameWindow) -> None:
+        timer, sr = self.timer, self.sr
+        core = slice(win.start - win.lo, win.stop - win.lo)
+
+        with timer.stage("stft"):
+            D = lr.stft(win.samples, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False)
+            S = np.abs(D)
+            power = S**2
+        with timer.stage("mel"):
+            mel = self.mel_basis @ S
+            mel_power = self.mel_basis @ power
+
+        with timer.stage("chroma"):
+            if self.tuning is None:
+                self.tuning = lr.estimate_tuning(S=S, sr=sr, bins_per_octave=12)
+            chroma = lr.feature.chroma_stft(S=S[:, core], sr=sr, tuning=self.tuning)
+            self.stats["chroma"].update(chroma.ravel())
+        with timer.stage("spectral"):
+            Sc = S[:, core]
+            centroid = lr.feature.spectral_centroid(S=Sc, sr=sr)
+            self.stats["rms"].update(lr.feature.rms(S=Sc)[0])
+            self.stats["spectral_centroids"].update(centroid[0])
+            self.stats["spectral_bandwidth"].update(
+                lr.feature.spectral_bandwidth(S=Sc, sr=sr, centroid=centroid)[0]
+            )
+            self.stats["spectral_rolloff"].update(lr.feature.spectral_rolloff(S=Sc, sr=sr)[0])
+            self.stats["spectral_contrast"].update(lr.feature.spectral_contrast(S=Sc, sr=sr).ravel())
+            self.stats["spectral_flatness"].update(lr.feature.spectral_flatness(S=Sc)[0])
+        with timer.stage("zcr"):
+            zcr = lr.feature.zero_crossing_rate(
+                win.samples, frame_length=N_FFT, hop_length=HOP_LENGTH, center=False
+            )
+            self.stats["zero_crossing_rate"].update(zcr[0, core])
+        with timer.stage("beat"):
+            # Разность с предыдущим кадром, как в onset_strength(lag=1)
+            mel_db = self._to_db(mel_power, "mel_peak_db")
+            first = max(win.start - win.lo, 1)
+            diff = np.maximum(0.0, mel_db[:, first : core.stop] - mel_db[:, first - 1 : core.stop - 1])
+            self.onset_diffs.append(np.median(diff, axis=0).astype(np.float32))
+        with timer.stage("mfcc"):
+            S_db = self._to_db(power, "power_peak_db")
+            self.mfcc.update(lr.feature.mfcc(S=S_db[:, core], sr=sr, n_mfcc=N_MFCC))
+        with timer.stage("hpss"):
+            D_harmonic, D_percussive = lr.decompose.hpss(D)
+            # Сэмплы сигнала, принадлежащие кадрам [start, stop) окна
+            first_sample = (win.start - win.lo) * HOP_LENGTH + N_FFT // 2
+            last_sample = (win.stop - win.lo) * HOP_LENGTH + N_FFT // 2
+            if win.length is not None:
+                last_sample = min(last_sample, win.length - win.lo * HOP_LENGTH + N_FFT // 2)
+            harmonic = lr.istft(D_harmonic, hop_length=HOP_LENGTH, center=False)[first_sample:last_sample]
+            percussive = lr.istft(D_percussive, hop_length=HOP_LENGTH, center=False)[first_sample:last_sample]
+            self.harmonic_sum += float(np.abs(harmonic).sum())
+            self.percussive_sum += float(np.abs(percussive).sum())
+            self.samples += harmonic.size
+        with timer.stage("mel_entropy"):
+            mel_core = mel[:, core]
+            mel_norm = mel_core / (mel_core.sum(axis=0, keepdims=True) + 1e-6)
+            self.stats["mel_entropy"].update(-np.sum(mel_norm * np.log(mel_norm + 1e-6), axis=0))
+
+    def feed(self, blocks: Iterable[np.ndarray]) -> None:
+        """Обрабатывает один непрерывный отрезок сигнала; отрезков может быть несколько"""
+        n_frames = 0
+        for win in frame_windows(blocks):
+            self.process(win)
+            n_frames = win.stop
+
+        # Сдвиг как в onset_strength(center=True): lag + n_fft // (2 * hop)
+        pad = np.zeros(1 + N_FFT // (2 * HOP_LENGTH), dtype=np.float32)
+        self.onset_envelopes.append(np.concatenate([pad, *self.onset_diffs])[:n_frames])
+        self.onset_diffs = []
+
+    def result(self) -> dict[str, float]:
+        features: dict[str, float] = {}
+        for name, stats in self.stats.items():
+            features[f"{name}_mean"] = float(stats.mean)
+            features[f"{name}_var"] = float(stats.var)
+
+        for i in range(N_MFCC):
+            features[f"mfcc_{i + 1}_mean"] = float(self.mfcc.mean[i])
+            features[f"mfcc_{i + 1}_var"] = float(self.mfcc.var[i])
+
+        with self.timer.stage("beat"):
+            features["tempo"] = tempo_from_onsets(np.concatenate(self.onset_envelopes), self.sr)
+
+        samples = max(self.samples, 1)
+        features["harmonic_energy"] = self.harmonic_sum / samples
+        features["percussive_energy"] = self.percussive_sum / samples
+        features["harmonic_percussive_ratio"] = features["harmonic_energy"] / (features["percussive_energy"] + 1e-6)
+        return features
+
+
+def extract_streaming(
+    blocks: Callable[[int, int | None], Iterator[np.ndarray]],
+    sr: int,
+    timer: StageTimer | None = None,
+) -> dict[str, float]:
+    """Потоковый анализ: ``blocks(start, stop)`` должен уметь читать источник повторно
+
+    Первый проход находит границы trim по RMS, второй считает признаки по обрезанному сигналу.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("trim"):
+        start, stop = trim_bounds(blocks(0, None))
+
+    extractor = StreamingFeatureExtractor(sr, timer)
+    extractor.feed(blocks(start, stop))
+    return extractor.result()
+
+
+def extract_excerpts(
+    blocks: Callable[[int, int | None], Iterator[np.ndarray]],
+    sr: int,
+    count: int,
+    seconds: float,
+    timer: StageTimer | None = None,
+) -> dict[str, float]:
+    """Быстрый профиль: те же признаки, но только по ``count`` окнам по ``seconds`` секунд
+
+    Статистики окон сливаются в общие накопители, огибающие онсетов склеиваются для оценки темпа.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("trim"):
+        start, stop = trim_bounds(blocks(0, None))
+
+    extractor = StreamingFeatureExtractor(sr, timer)
+    for excerpt_start, excerpt_stop in excerpt_bounds(start, stop, int(seconds * sr), count):
+        extractor.feed(blocks(excerpt_start, excerpt_stop))
+    return extractor.result()
@@ -1,42 +1,300 @@
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+
 from loguru import logger
+from taskiq import TaskiqEvents, TaskiqState
 
 from src.broker_taskiq import broker
+from src.config import Config
 from src.database import async_session_maker
 
-from src.app.models import crud_features
+from src.app.models import Track, crud_analysis_attempt, crud_features, crud_playlist_embedding, crud_track
 from src.app.schemas import TrackFeatures
-from src.app.services import RecomendationService
-from src.repository import IntegrityConflictException
+from src.app.services import EXTRACTOR_VERSION, SAMPLE_RATE, RecomendationService
+from src.app.executor import analysis_executor, analyze_audio, analyze_audio_file
+from src.app.index_store import IndexSnapshot, load_current_snapshot, read_meta, update_meta
+from src.app.metrics import SIZE_BUCKETS, registry, slow_jobs, start_metrics_server
+from src.app.profiling import PeakRss, StageTimer, format_report
+from src.repository import NotFoundException
 
+job_stage_seconds = registry.histogram(
+    "track_job_stage_seconds",
+    "track_features stages: lookup, queue, resolve, download, decode, cache_*, analysis, save, total",
+    ("stage",),
+)
+analysis_stage_seconds = registry.histogram(
+    "track_analysis_stage_seconds",
+    "Feature extraction stages inside the analysis pool",
+    ("stage",),
+)
+download_bytes = registry.histogram("track_download_bytes", "Compressed audio bytes per job", buckets=SIZE_BUCKETS)
+jobs_total = registry.counter("track_jobs_total", "track_features jobs by result", ("status",))
+index_build_seconds = registry.histogram(
+    "index_build_seconds", "Full index rebuild stages: fetch, prepare, add_items, neighbors, save, total", ("stage",)
+)
+index_build_throughput = registry.histogram(
+    "index_build_vectors_per_second",
+    "Vectors added to HNSW per second in a full rebuild",
+    buckets=tuple(10**p for p in range(2, 8)),
+)
+index_builds_total = registry.counter(
+    "index_builds_total", "Recommendation index task runs by result: skipped, updated, rebuilt", ("result",)
+)
+index_build_peak_bytes = registry.histogram(
+    "index_build_peak_rss_bytes", "RSS added by a full index rebuild", buckets=SIZE_BUCKETS
+)
+
+
+@broker.on_event(TaskiqEvents.WORKER_STARTUP)
+async def start_worker_metrics(state: TaskiqState) -> None:
+    if Config.WORKER_METRICS_PORT is None:
+        return
+
+    # Процессов воркера несколько: каждый занимает первый свободный порт
+    for port in range(Config.WORKER_METRICS_PORT, Config.WORKER_METRICS_PORT + 32):
+        try:
+            state.metrics_server = start_metrics_server(port)
+            return
+        except OSError:
+            continue
+    logger.warning(f"⚠  No free port for worker metrics from {Config.WORKER_METRICS_PORT}")
+
+
+@broker.on_event(TaskiqEvents.WORKER_SHUTDOWN)
+async def shutdown_analysis_pool(state: TaskiqState) -> None:
+    analysis_executor.shutdown()
+
+
+async def get_track(yt_id: str) -> Track | None:
+    async with async_session_maker() as session:
+        try:
+            return await crud_track.get_one_by_id(session, yt_id, column="yt_id")
+        except NotFoundException:
+            return None
+
+
+def use_streaming(track: Track | None) -> bool:
+    """Потоковый анализ включён глобально или трек слишком длинный для анализа в памяти"""
+    if Config.ANALYSIS_MODE == "streaming":
+        return True
+    return track is not None and track.duration >= Config.STREAMING_MIN_DURATION
+
+
+async def features_up_to_date(yt_id: str) -> bool:
+    async with async_session_maker() as session:
+        try:
+            features = await crud_features.get_one_by_id(session, yt_id, column="yt_id")
+        except NotFoundException:
+            return False
+    return features.extractor_version >= EXTRACTOR_VERSION
+
+
+def record_job(yt_id: str, timer: StageTimer, status: str) -> None:
+    jobs_total.inc(status=status)
+    if status == "skipped":
+        return
+
+    for stage, seconds in timer.stages.items():
+        # analysis.* уже записаны в analysis_stage_seconds, в трассе они нужны для разбивки
+        if not stage.startswith("analysis."):
+            job_stage_seconds.observe(seconds, stage=stage)
+    job_stage_seconds.observe(timer.total, stage="total")
+    if "download_bytes" in timer.counters:
+        download_bytes.observe(timer.counters["download_bytes"])
+    slow_jobs.record("track_features", yt_id, timer.total, timer.report(), timer.counters)
+
+
+async def analyze_track(yt_id: str, force: bool, timer: StageTimer) -> str:
+    with timer.stage("lookup"):
+        # Задача могла быть поставлена повторно, пока предыдущая ещё не завершилась
+        if not force and await features_up_to_date(yt_id):
+            logger.info(f"⏭  Features are up to date: {yt_id}")
+            return "skipped"
+        track = await get_track(yt_id)
 
-@broker.task
-async def track_features(yt_id: str):
     service = RecomendationService()
-    a_dta = service.download_audio(yt_id)
-    if not a_dta:
-        raise ValueError(f"yt_id is invalid: {yt_id}")
-    logger.info("✅ Track download complete. Start analysis...")
+    uri = track.source_uri if track else None
+    streaming = use_streaming(track)
+    with timer.stage("queue"):
+        await analysis_executor.slot.acquire()
+    try:
+        if streaming:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = await asyncio.to_thread(
+                    service.download_audio_file, yt_id, tmp_dir, Config.ANALYSIS_MAX_DURATION, uri, timer
+                )
+                if not path:
+                    raise ValueError(f"yt_id is invalid: {yt_id}")
+                logger.info("✅ Track download complete. Start streaming analysis...")
+
+                features, report = await analysis_executor.run(
+                    analyze_audio_file, path, SAMPLE_RATE, Config.ANALYSIS_PROFILE
+                )
+        else:
+            a_dta = await asyncio.to_thread(service.download_audio, yt_id, Config.ANALYSIS_MAX_DURATION, uri, timer)
+            if not a_dta:
+                raise ValueError(f"yt_id is invalid: {yt_id}")
+            logger.info("✅ Track download complete. Start analysis...")
+
+            features, report = await analysis_executor.run(
+                analyze_audio, a_dta.audio_data, a_dta.sr, Config.ANALYSIS_PROFILE
+            )
+            del a_dta
+    finally:
+        analysis_executor.slot.release()
 
-    features = service.get_sample_features(a_dta)
-    logger.info("✅ Track analysis complete. Saving results...")
+    logger.info(f"✅ Track analysis complete in {report['total']:.2f}s ({format_report(report)}). Saving results...")
+    timer.add("analysis", report.pop("total"))
+    for stage, seconds in report.items():
+        analysis_stage_seconds.observe(seconds, stage=stage)
+        timer.add(f"analysis.{stage}", seconds)
     features["yt_id"] = yt_id
+    features["extractor_version"] = EXTRACTOR_VERSION
 
+    with timer.stage("save"):
+        async with async_session_maker() as session:
+            await crud_features.upsert(session, TrackFeatures.model_validate(features))
+            # Сверка векторов плейлистов: трек мог быть добавлен до анализа или пересчитан
+            playlists = await crud_playlist_embedding.recompute_for_track(session, yt_id)
+            await crud_analysis_attempt.clear(session, yt_id)
+    logger.info(f"✅ Result saved, {playlists} playlist embeddings reconciled.")
+    return "ok"
+
+
+async def record_failure(yt_id: str, error: Exception) -> None:
+    """Неудача откладывает следующую попытку reanalyze_stale_tracks (backoff в analysis_attempts)"""
+    try:
+        async with async_session_maker() as session:
+            failures = await crud_analysis_attempt.record_failure(session, yt_id, str(error))
+    except Exception as e:
+        # Учёт попыток не должен скрывать исходную ошибку задачи
+        logger.error(f"❌ Failed to record analysis failure of {yt_id}: {e}")
+        return
+    logger.warning(f"⚠  Analysis of {yt_id} failed ({failures} in a row): {error}")
+
+
+@broker.task
+async def track_features(yt_id: str, force: bool = False):
+    timer = StageTimer()
+    status = "failed"
+    try:
+        status = await analyze_track(yt_id, force, timer)
+    except Exception as e:
+        await record_failure(yt_id, e)
+        raise
+    finally:
+        record_job(yt_id, timer, status)
+
+    if status == "ok":
+        logger.info(f"🎯 Task complete in {timer.total:.2f}s.")
+
+
+async def update_recommendation_index(
+    service: RecomendationService, snapshot: IndexSnapshot, fingerprint: str | None = None
+) -> str | None:
+    """Инкрементальное обновление; None - нужна полная пересборка"""
+    watermark = datetime.fromisoformat(snapshot.meta["watermark"])
+    # Окно перекрытия: строки, закоммиченные позже со штампом now() начала своей транзакции
+    since = watermark - timedelta(seconds=Config.INDEX_WATERMARK_OVERLAP)
     async with async_session_maker() as session:
-        await crud_features.create(session, TrackFeatures.model_validate(features))
-        await session.commit()
-        logger.info("✅ Result saved.")
+        changed = await crud_features.fetch_vectors(session, since=since)
+        live_ids = await crud_features.get_all_yt_ids(session)
+
+    known = set(snapshot.ids.yt_ids())
+    fresh = any(stamp > watermark or yt_id not in known for yt_id, stamp in zip(changed.yt_ids, changed.stamps))
+    if not fresh and live_ids == known:
+        # Иначе следующий запуск снова не совпадёт по отпечатку и заново загрузит снимок
+        if fingerprint is not None:
+            await asyncio.to_thread(update_meta, snapshot.version, fingerprint=fingerprint)
+        logger.info(f"⏭  Index {snapshot.version} is up to date.")
+        return snapshot.version
+
+    return await asyncio.to_thread(service.update_recommendation_index, snapshot, changed, live_ids, fingerprint)
+
 
-    logger.info("🎯 Task complete.")
+async def rebuild_recommendation_index(service: RecomendationService, fingerprint: str | None = None) -> str | None:
+    timer = StageTimer()
+    with PeakRss() as memory:
+        logger.info("Start build recommendation index. Fetch analisys data...")
+        with timer.stage("fetch"):
+            async with async_session_maker() as session:
+                matrix = await crud_features.fetch_vectors(session)
+
+        logger.info("✅ Fetch analisys data complete. Prepare data...")
+        version = await asyncio.to_thread(
+            service.build_recommendation_index, matrix, fingerprint=fingerprint, timer=timer
+        )
+
+    for stage, seconds in timer.stages.items():
+        index_build_seconds.observe(seconds, stage=stage)
+    index_build_seconds.observe(timer.total, stage="total")
+    index_build_peak_bytes.observe(memory.added)
+    throughput = ""
+    if timer.stages.get("add_items"):
+        vectors_per_second = len(matrix.yt_ids) / timer.stages["add_items"]
+        index_build_throughput.observe(vectors_per_second)
+        throughput = f", {vectors_per_second:,.0f} vectors/s"
+    logger.info(
+        f"📈 Index build: {len(matrix.yt_ids)} tracks{throughput}, matrix {matrix.vectors.nbytes / 2**20:.1f} MiB, "
+        f"peak RSS +{memory.added / 2**20:.1f} MiB ({memory.peak / 2**20:.0f} MiB), {timer.format()}"
+    )
+    return version
 
 
 @broker.task(schedule=[{"cron": "*/5 * * * *"}])
-async def build_recommendation_index():
-    logger.info("Start build recommendation index. Fetch analisys data...")
+async def build_recommendation_index(full: bool = False, force: bool = False):
+    """Инкрементальное обновление индекса или полная пересборка (``full``)
+
+    Если отпечаток таблицы признаков совпадает с сохранённым в опубликованном снимке, сборка
+    пропускается. ``force`` собирает всё равно: например, после смены параметров сборки.
+    """
     async with async_session_maker() as session:
-        tracks = await crud_features.get_all(session)
+        fingerprint = await crud_features.fingerprint(session)
+    if not force and fingerprint == read_meta().get("fingerprint"):
+        index_builds_total.inc(result="skipped")
+        logger.info(f"⏭  Features unchanged since the last build ({fingerprint}), index build skipped.")
+        return
 
-    logger.info("✅ Fetch analisys data complete. Prepare data...")
     service = RecomendationService()
-    service.build_recommendation_index(list(tracks[0]))
+    snapshot = None
+    if not full:
+        try:
+            snapshot = await asyncio.to_thread(load_current_snapshot)
+        except (OSError, RuntimeError, ValueError) as e:
+            logger.warning(f"⚠  Failed to load current index, full rebuild: {e}")
 
+    # Снимки без watermark (старый формат) обновлять инкрементально нельзя
+    if snapshot is not None and snapshot.meta.get("watermark"):
+        if await update_recommendation_index(service, snapshot, fingerprint) is not None:
+            index_builds_total.inc(result="updated")
+            logger.info("✅ Task complete.")
+            return
+
+    await rebuild_recommendation_index(service, fingerprint)
+    index_builds_total.inc(result="rebuilt")
     logger.info("✅ Task complete.")
+
+
+async def enqueue_stale_tracks(limit: int = Config.REANALYSIS_BATCH_SIZE) -> int:
+    """Ставит в очередь анализ не больше ``limit`` треков без признаков или с признаками старой версии"""
+    async with async_session_maker() as session:
+        yt_ids = await crud_features.get_stale_yt_ids(session, EXTRACTOR_VERSION, limit)
+        # Следующий запуск не поставит их снова, пока эти задачи в очереди
+        await crud_analysis_attempt.mark_enqueued(session, yt_ids)
+
+    for yt_id in yt_ids:
+        await track_features.kiq(yt_id)
+    return len(yt_ids)
+
+
+@broker.task(schedule=[{"cron": Config.REANALYSIS_CRON}])
+async def reanalyze_stale_tracks():
+    """Инкрементальный пересчёт: за один запуск в очередь попадает не больше REANALYSIS_BATCH_SIZE треков
+
+    Остальные устаревшие строки подхватят следующие запуски, поэтому смена EXTRACTOR_VERSION
+    не забивает очередь всем каталогом, а аудио при наличии берётся из audio_cache.
+    """
+    queued = await enqueue_stale_tracks()
+    if queued:
+        logger.info(f"🔁 Queued {queued} stale tracks for re-analysis (extractor v{EXTRACTOR_VERSION})")
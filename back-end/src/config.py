@@ -17,6 +17,84 @@ class ConfigClass(BaseSettings):
 
     NATS_URL: str | None = Field(alias="NATS_URL")
 
+    # "process" - анализ в пуле процессов, "thread" - в пуле потоков воркера
+    ANALYSIS_EXECUTOR: str = Field(default="process", alias="ANALYSIS_EXECUTOR")
+    ANALYSIS_WORKERS: int | None = Field(default=None, alias="ANALYSIS_WORKERS")
+    ANALYSIS_MAX_CONCURRENCY: int | None = Field(default=None, alias="ANALYSIS_MAX_CONCURRENCY")
+    # "batch" - весь трек в памяти, "streaming" - блоками из файла; длинные треки всегда потоково
+    ANALYSIS_MODE: str = Field(default="batch", alias="ANALYSIS_MODE")
+    STREAMING_MIN_DURATION: int = Field(default=900, alias="STREAMING_MIN_DURATION")
+    # "full" - весь трек, "fast" - только FAST_EXCERPT_COUNT окон по FAST_EXCERPT_SECONDS секунд
+    ANALYSIS_PROFILE: str = Field(default="full", alias="ANALYSIS_PROFILE")
+    FAST_EXCERPT_COUNT: int = Field(default=3, alias="FAST_EXCERPT_COUNT")
+    FAST_EXCERPT_SECONDS: float = Field(default=30.0, alias="FAST_EXCERPT_SECONDS")
+    # Декодируется не больше стольких секунд от начала трека (None - без ограничения)
+    ANALYSIS_MAX_DURATION: int | None = Field(default=None, alias="ANALYSIS_MAX_DURATION")
+
+    # Кэш декодированного аудио (f32le по yt_id), 0 - выключен
+    AUDIO_CACHE_DIR: str = Field(default="audio_cache", alias="AUDIO_CACHE_DIR")
+    AUDIO_CACHE_MAX_BYTES: int = Field(default=10 * 2**30, alias="AUDIO_CACHE_MAX_BYTES")
+
+    # Пересчёт признаков треков без признаков или со старой EXTRACTOR_VERSION
+    REANALYSIS_CRON: str = Field(default="*/10 * * * *", alias="REANALYSIS_CRON")
+    REANALYSIS_BATCH_SIZE: int = Field(default=50, alias="REANALYSIS_BATCH_SIZE")
+    # Трек в очереди не ставится повторно столько секунд (потом считается потерянным), с.
+    # После неудачи повтор через RETRY * 2^(неудач - 1) с; после MAX_FAILURES неудач трек не
+    # пересчитывается, пока не удалить его строку analysis_attempts
+    REANALYSIS_ENQUEUED_TTL: int = Field(default=3600, alias="REANALYSIS_ENQUEUED_TTL")
+    REANALYSIS_RETRY_SECONDS: int = Field(default=600, alias="REANALYSIS_RETRY_SECONDS")
+    REANALYSIS_MAX_FAILURES: int = Field(default=5, alias="REANALYSIS_MAX_FAILURES")
+
+    # Порт /metrics и /traces воркера (None - не поднимать), порог записи трассы медленной задачи
+    WORKER_METRICS_PORT: int | None = Field(default=9200, alias="WORKER_METRICS_PORT")
+    SLOW_JOB_SECONDS: float = Field(default=120.0, alias="SLOW_JOB_SECONDS")
+
+    # Каталог снимков индекса рекомендаций и период проверки новой версии в API, с
+    INDEX_DIR: str = Field(default="recommendations_cache", alias="INDEX_DIR")
+    INDEX_CHECK_INTERVAL: float = Field(default=5.0, alias="INDEX_CHECK_INTERVAL")
+    # Unix-сокет сервера индекса (python -m src.app.index_server): API-воркеры запрашивают kNN у него,
+    # а не держат свою копию индекса; None - индекс в каждом процессе. Таймаут запроса, с
+    INDEX_SERVER_SOCKET: str | None = Field(default=None, alias="INDEX_SERVER_SOCKET")
+    INDEX_SERVER_TIMEOUT: float = Field(default=5.0, alias="INDEX_SERVER_TIMEOUT")
+    # Сколько последних версий снимка хранить на диске для отката
+    INDEX_KEEP_VERSIONS: int = Field(default=3, alias="INDEX_KEEP_VERSIONS")
+    # Запас ёмкости индекса при росте, доля удалённых до полной пересборки, перекрытие watermark, с
+    INDEX_HEADROOM: float = Field(default=0.25, alias="INDEX_HEADROOM")
+    INDEX_MAX_DELETED_FRACTION: float = Field(default=0.2, alias="INDEX_MAX_DELETED_FRACTION")
+    INDEX_WATERMARK_OVERLAP: int = Field(default=60, alias="INDEX_WATERMARK_OVERLAP")
+    # Параметры HNSW: связей на узел, ширина поиска при сборке и при запросе (10 - значение hnswlib),
+    # подобраны по benchmarks.index
+    INDEX_M: int = Field(default=16, alias="INDEX_M")
+    INDEX_EF_CONSTRUCTION: int = Field(default=200, alias="INDEX_EF_CONSTRUCTION")
+    INDEX_EF: int = Field(default=10, alias="INDEX_EF")
+    # Потоков hnswlib при сборке индекса и таблицы соседей (-1 - все ядра)
+    INDEX_BUILD_THREADS: int = Field(default=-1, alias="INDEX_BUILD_THREADS")
+    # Размерность PCA-проекции векторов перед индексом (0 - индекс по всем признакам)
+    INDEX_PCA_DIM: int = Field(default=0, alias="INDEX_PCA_DIM")
+    # Уровни качества рекомендаций от дорогого к дешёвому: ef запроса HNSW, пул кандидатов
+    # (top_n * pool) и соседей на трек плейлиста; уровень запрашивается параметром quality
+    RECOMMEND_TIERS: dict[str, dict[str, int]] = Field(
+        default={
+            "high": {"ef": 200, "pool": 10, "neighbors": 10},
+            "balanced": {"ef": 50, "pool": 5, "neighbors": 5},
+            "fast": {"ef": 10, "pool": 3, "neighbors": 3},
+        },
+        alias="RECOMMEND_TIERS",
+    )
+    RECOMMEND_DEFAULT_TIER: str = Field(default="balanced", alias="RECOMMEND_DEFAULT_TIER")
+    # Бюджет задержки расчёта рекомендаций, мс: при превышении отдаётся более дешёвый уровень
+    RECOMMEND_LATENCY_BUDGET_MS: float = Field(default=100.0, alias="RECOMMEND_LATENCY_BUDGET_MS")
+    # Записей в кэше готовых рекомендаций API (плейлист x уровень качества), 0 - без кэша
+    RECOMMEND_CACHE_SIZE: int = Field(default=10_000, alias="RECOMMEND_CACHE_SIZE")
+    # Похожих треков на странице трека и записей в их кэше (трек x версия индекса), 0 - без кэша
+    SIMILAR_TRACKS_TOP_N: int = Field(default=10, alias="SIMILAR_TRACKS_TOP_N")
+    SIMILAR_CACHE_SIZE: int = Field(default=50_000, alias="SIMILAR_CACHE_SIZE")
+    # Соседей на трек в таблице, предрасчитанной при сборке индекса (neighbors.npy), 0 - не строить.
+    # Этап 2 рекомендаций берёт соседей из неё, если их хватает уровню качества
+    INDEX_NEIGHBORS: int = Field(default=0, alias="INDEX_NEIGHBORS")
+    # Потоков hnswlib на пакетный kNN-запрос рекомендаций (-1 - все ядра)
+    KNN_THREADS: int = Field(default=-1, alias="KNN_THREADS")
+
     DB_URL: str = Field(default="")
 
     def __init__(self, *args, **kwargs):
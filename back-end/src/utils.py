@@ -1,5 +1,8 @@
 import json
+import threading
+from collections import OrderedDict
 from functools import wraps
+from typing import Any, Hashable
 from aiocache import RedisCache
 from fastapi import HTTPException
 
@@ -37,3 +40,38 @@ def cache_response(ttl: int = 60, namespace: str = "main"):
         return wrapper
 
     return decorator
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш в памяти процесса на ``maxsize`` записей"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -1,2 +1,2 @@
 from src.broker_taskiq import broker, scheduler
-from src.app.tasks import build_recommendation_index, track_features
+from src.app.tasks import build_recommendation_index, reanalyze_stale_tracks, track_features
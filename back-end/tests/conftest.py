@@ -0,0 +1,14 @@
+import os
+
+# Config обязателен при импорте src: для тестов без БД и брокера хватает заглушек значений
+for name, value in {
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_PASS": "test",
+    "DB_USER": "test",
+    "DB_NAME": "test",
+    "SESSION_LIVE_TIME": "3600",
+    "SESSION_SECRET": "test",
+    "NATS_URL": "nats://localhost:4222",
+}.items():
+    os.environ.setdefault(name, value)
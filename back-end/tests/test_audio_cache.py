@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+
+from src.app.audio_cache import AudioCache
+
+
+def test_evicts_least_recently_read(tmp_path):
+    track = np.zeros(1000, dtype=np.float32)
+    cache = AudioCache(str(tmp_path), max_bytes=2 * track.nbytes)
+    for age, yt_id in enumerate(["a", "b"]):
+        os.utime(cache.put(yt_id, track), (1000 + age, 1000 + age))
+    # Чтение обновляет время доступа: самой старой становится b
+    assert cache.get("a") is not None
+
+    cache.put("c", track)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_corrupted_entry_is_dropped(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=1 << 20)
+    path = cache.put("a", np.arange(1000, dtype=np.float32))
+    with open(path, "r+b") as f:
+        f.write(b"\xff\xff\xff\xff")
+
+    assert cache.get("a") is None
+    assert not os.path.exists(path)
@@ -0,0 +1,23 @@
+from src.app.id_table import EMPTY, IdTable
+
+
+def test_labels_of_unrepresentable_ids():
+    table = IdTable.from_ids(["dQw4w9WgXcQ", "lc_" + "a" * 22])
+
+    # Длинный id не обрезается до совпадения с хранимым, не-ASCII не роняет поиск
+    labels = table.labels_of(["lc_" + "a" * 30, "трек", "dQw4w9WgXcQ", "lc_" + "a" * 22])
+
+    assert labels.tolist() == [-1, -1, 0, 1]
+
+
+def test_saved_table_maps_both_ways(tmp_path):
+    ids = IdTable.from_ids(["c", "a", "b"]).ids.copy()
+    ids[1] = EMPTY  # метка "a" освобождена
+    IdTable(ids).save(tmp_path / "ids.npy", tmp_path / "ids_order.npy")
+
+    table = IdTable.load(tmp_path / "ids.npy", tmp_path / "ids_order.npy")
+
+    assert len(table) == 2 and table.capacity == 3
+    assert table.lookup([0, 1, 2, 7, -1]) == ["c", "", "b", "", ""]
+    assert table.labels_of(["b", "a", "c", ""]).tolist() == [2, -1, 0, -1]
+    assert table.yt_ids() == ["b", "c"]
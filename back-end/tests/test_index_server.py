@@ -0,0 +1,32 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from src.app import index_server
+from src.app.index_server import IndexServer
+
+
+def test_loading_new_version_does_not_block_loaded_one(tmp_path, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def load_snapshot(directory, version):
+        if version == "new":
+            started.set()
+            release.wait(5)
+        return SimpleNamespace(version=version, index=SimpleNamespace(get_current_count=lambda: 1))
+
+    monkeypatch.setattr(index_server, "load_snapshot", load_snapshot)
+    server = IndexServer(str(tmp_path / "index.sock"), str(tmp_path), keep=1)
+    server.snapshot("old")
+
+    loader = threading.Thread(target=server.snapshot, args=("new",))
+    loader.start()
+    assert started.wait(5)
+    began = time.perf_counter()
+    assert server.snapshot("old").version == "old"
+    assert time.perf_counter() - began < 1
+
+    release.set()
+    loader.join(5)
+    assert server.snapshot("new").version == "new"
+    assert list(server._snapshots) == ["new"]
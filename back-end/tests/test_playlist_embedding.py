@@ -0,0 +1,16 @@
+import pytest
+
+from src.app.models import crud_playlist_embedding
+
+
+@pytest.mark.parametrize(
+    "rows, weight, change",
+    [
+        (1, 1, 1),  # первое добавление трека
+        (2, 1, 0),  # повторное добавление: трек уже учтён
+        (0, -2, -1),  # удалены все строки трека
+        (1, -1, 0),  # осталась другая строка того же трека
+    ],
+)
+def test_repeated_track_counts_once(rows, weight, change):
+    assert crud_playlist_embedding._presence_change(rows, weight) == change
@@ -0,0 +1,17 @@
+from src.app.quality import QualityTier, TierSelector
+
+
+def test_falls_back_to_cheaper_tier_over_budget():
+    tiers = [QualityTier("high", 200, 10, 10), QualityTier("balanced", 50, 5, 5), QualityTier("fast", 10, 3, 3)]
+    selector = TierSelector(tiers, "high", budget=0.1, alpha=1.0, recovery=60.0)
+
+    selector.observe(tiers[0], 0.5)
+    selector.observe(tiers[1], 0.2)
+    # Оба дорогих уровня выше бюджета, последний отдаётся всегда
+    assert selector.choose().name == "fast"
+
+    selector.observe(tiers[1], 0.01)
+    assert selector.choose().name == "balanced"
+    # Оценка старше recovery забывается, и уровень пробуется снова
+    selector.recovery = 0.0
+    assert selector.choose().name == "high"
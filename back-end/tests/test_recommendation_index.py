@@ -0,0 +1,85 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.config import Config
+from src.database import get_async_session
+from src.app.index_store import load_current_snapshot, read_meta, update_meta
+from src.app.models import FEATURE_COLUMNS
+from src.app.routes import router
+from src.app.services import RecomendationService
+
+
+def feature_matrix(yt_ids: list[str], seed: int = 0) -> SimpleNamespace:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((len(yt_ids), len(FEATURE_COLUMNS))).astype(np.float32)
+    return SimpleNamespace(yt_ids=yt_ids, vectors=vectors, stamps=[datetime.now()] * len(yt_ids))
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / Config.INDEX_DIR
+
+
+def build_and_delete(size: int, deleted: list[str]):
+    """Снимок из ``size`` треков, затем инкрементальное обновление, удаляющее ``deleted``"""
+    service = RecomendationService()
+    matrix = feature_matrix([f"t{i}" for i in range(size)])
+    service.build_recommendation_index(matrix)
+    live = set(matrix.yt_ids) - set(deleted)
+    empty = SimpleNamespace(yt_ids=[], vectors=np.empty((0, len(FEATURE_COLUMNS)), np.float32), stamps=[])
+    assert service.update_recommendation_index(load_current_snapshot(), empty, live) is not None
+    return service, matrix, load_current_snapshot()
+
+
+def test_recommend_with_ef_above_live_count(index_dir):
+    service, matrix, snapshot = build_and_delete(150, ["t3"])
+
+    result = service.recommend_for_embedding(
+        matrix.vectors[:5].mean(axis=0), matrix.yt_ids[:5], snapshot.index, snapshot.ids, ef=200, pool_factor=30
+    )
+
+    assert len(result) == 10
+    assert "t3" not in result
+
+
+def test_similar_tracks_skips_deleted_neighbors(index_dir, monkeypatch):
+    monkeypatch.setattr(Config, "INDEX_NEIGHBORS", 12)
+    service = RecomendationService()
+    matrix = feature_matrix([f"t{i}" for i in range(300)])
+    service.build_recommendation_index(matrix)
+    neighbors = load_current_snapshot().neighbors
+    # Три соседа t0 (первый сосед - сам трек) удаляются, строка t0 остаётся прежней
+    deleted = [f"t{label}" for label in neighbors.labels[0, 1:4].tolist()]
+
+    _, _, snapshot = build_and_delete(300, deleted)
+
+    similar = service.similar_tracks("t0", snapshot.index, snapshot.ids, top_n=5, neighbors=snapshot.neighbors)
+    assert len(similar) == 5
+    assert not {track_id for track_id, _ in similar} & set(deleted)
+
+
+@pytest.mark.parametrize("yt_id", ["трек", "lc_" + "a" * 30, "a b"])
+def test_similar_tracks_route_rejects_invalid_ids(yt_id):
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_async_session] = lambda: None
+
+    response = TestClient(app).get(f"/app/tracks/{yt_id}/similar")
+
+    assert response.status_code == 422
+
+
+def test_update_meta_keeps_snapshot_loadable(index_dir):
+    service = RecomendationService()
+    version = service.build_recommendation_index(feature_matrix([f"t{i}" for i in range(50)]), fingerprint="50:a")
+
+    update_meta(version, fingerprint="50:b")
+
+    assert read_meta()["fingerprint"] == "50:b"
+    assert load_current_snapshot().version == version
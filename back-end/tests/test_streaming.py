@@ -0,0 +1,25 @@
+from functools import partial
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_track
+from src.app.decoding import SAMPLE_RATE
+from src.app.models import FEATURE_COLUMNS
+from src.app.services import AudioData, RecomendationService
+from src.app.streaming import BLOCK_SAMPLES, extract_streaming, iter_array_blocks
+
+
+def test_streaming_matches_batch_features():
+    y = synthetic_track(0, 60.0).astype(np.float32)
+    assert len(y) > 2 * BLOCK_SAMPLES
+
+    batch = RecomendationService().get_sample_features(AudioData(y, SAMPLE_RATE))
+    streaming = extract_streaming(partial(iter_array_blocks, y), SAMPLE_RATE)
+
+    # Расхождения только от оценки строя хромы по первому блоку и порога top_db по текущему максимуму
+    np.testing.assert_allclose(
+        [float(np.squeeze(streaming[c])) for c in FEATURE_COLUMNS],
+        [float(np.squeeze(batch[c])) for c in FEATURE_COLUMNS],
+        rtol=2e-3,
+        atol=1e-4,
+    )